@@ -0,0 +1,127 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+
+from engine import AI, EVALUATION_WALL_WEIGHTS, MAX_PLY, MAX_SEARCH_DEPTH, encode_move, format_move, format_position
+from protocol import parse_position_command, side_score
+
+# --- Constants ---
+DEFAULT_DEPTH = 4  # Used when no depth, node or time limit is given
+TT_SIZE_MB = 16  # Per position; every search starts from an empty table
+IN_FLIGHT_PER_WORKER = 4  # Positions handed out ahead of the output per worker; bounds memory on any input size
+
+
+def parse_line(line):
+    """ (BoardState, is_p2_turn) for an input line: a position in notation or 'startpos', either one
+    optionally followed by 'moves ...' as in the engine protocol's position command.
+    """
+    words = line.split()
+    return parse_position_command(words if words[0] == 'startpos' else ['text'] + words)
+
+
+def analyze_position(task):
+    """ Searches one input line in a worker and returns its JSON output line.
+
+    Each position gets a fresh AI, so a depth- or node-limited result doesn't depend on which positions
+    the same worker searched before.
+    """
+    line_number, text, max_depth, node_limit, time_limit, evaluation = task
+    result = {'line': line_number, 'input': text}
+    try:
+        state, is_p2_turn = parse_line(text)
+    except ValueError as error:
+        result['error'] = str(error)
+        return json.dumps(result)
+    result['position'] = format_position(state, is_p2_turn)
+    if state.is_game_over():
+        result['error'] = "the game is over"
+        return json.dumps(result)
+
+    ai = AI(2 if is_p2_turn else 1, TT_SIZE_MB, max_depth=max_depth, evaluation=evaluation)
+    ai.node_limit = node_limit
+    start_time = time.time()
+    move, _ = ai.find_best_move(state, time_limit)
+    completed = [entry for entry in ai.search_stats if entry['completed']]
+    # find_best_move may answer from a deeper iteration the limit cut short, so the move, score, depth and
+    # pv all come from the last completed depth instead; only a search that completed none reports its move.
+    if completed:
+        last = completed[-1]
+        result.update({'bestmove': format_move(last['move']), 'score': side_score(last['score'], is_p2_turn),
+                       'depth': last['depth'], 'pv': [format_move(code) for code in last['pv']]})
+    else:
+        result.update({'bestmove': format_move(encode_move(move)) if move is not None else None, 'score': None,
+                       'depth': 0, 'pv': []})
+    result.update({'nodes': ai.nodes, 'seconds': round(time.time() - start_time, 3)})
+    return json.dumps(result)
+
+
+def read_tasks(lines, max_depth, node_limit, time_limit, evaluation):
+    """ One task per non-blank, non-comment ('#') line, numbered by its line in the input """
+    for line_number, line in enumerate(lines, 1):
+        text = line.strip()
+        if text and not text.startswith('#'):
+            yield line_number, text, max_depth, node_limit, time_limit, evaluation
+
+
+def analyze(tasks, output, workers):
+    """ Runs tasks across a process pool and writes their results in input order as they finish.
+
+    Pool.imap would read the whole input ahead, so tasks are handed out by hand and only a few per
+    worker are ever waiting; a slow position holds back the output, not the input's memory.
+    """
+    count = 0
+    window = IN_FLIGHT_PER_WORKER * (workers or os.cpu_count() or 1)
+    with Pool(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(analyze_position, (task,)))
+            if len(pending) >= window:
+                output.write(pending.popleft().get() + '\n')
+                output.flush()
+                count += 1
+        while pending:
+            output.write(pending.popleft().get() + '\n')
+            output.flush()
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search many positions and stream the results as JSONL in input "
+                                                 "order.")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="File with one position per line ('-', the default, reads stdin). A line is a position "
+                             "such as 'e1 e9 10 10 - 1' or 'startpos', optionally followed by 'moves e2 e8 ...'")
+    parser.add_argument('--depth', type=int, default=None,
+                        help=f"Search depth (default {DEFAULT_DEPTH}, or {MAX_SEARCH_DEPTH} under a node or time limit)")
+    parser.add_argument('--nodes', type=int, default=None, help="Stop each search after about this many nodes")
+    parser.add_argument('--time', type=float, default=None, help="Seconds per position")
+    parser.add_argument('--eval', default='path', choices=list(EVALUATION_WALL_WEIGHTS))
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument('--output', default='-', help="JSONL file for the results ('-', the default, is stdout)")
+    args = parser.parse_args()
+    if args.depth is not None and not 1 <= args.depth <= MAX_PLY:
+        parser.error(f"--depth must be 1-{MAX_PLY}")
+    if args.depth is None and args.nodes is None and args.time is None:
+        args.depth = DEFAULT_DEPTH
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    start_time = time.time()
+    try:
+        tasks = read_tasks(source, args.depth or MAX_SEARCH_DEPTH, args.nodes or math.inf,
+                           math.inf if args.time is None else args.time, args.eval)
+        count = analyze(tasks, output, args.workers)
+    finally:
+        if source is not sys.stdin: source.close()
+        if output is not sys.stdout: output.close()
+    print(f"Analyzed {count} positions in {time.time() - start_time:.1f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
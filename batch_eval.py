@@ -0,0 +1,76 @@
+"""NumPy-batched shortest-path lengths for many wall candidates at once.
+
+Placing a wall and repairing both distance fields costs a Python-level search per candidate. Here the
+open-edge masks of K candidate boards are stacked into a (K, 9, 9) array and both players' distances
+to their goal rows are found by expanding all 2K frontiers together, one array operation per step.
+
+NumPy is optional: when it is missing, available() is False and the engine orders walls without it.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import engine
+
+_wall_keep = None
+
+
+def wall_keep():
+    """ (128, 81) array whose row index is the open_dirs mask that survives placing wall slot index """
+    global _wall_keep
+    if _wall_keep is None:
+        _wall_keep = np.full((len(engine.WALL_EDGES), engine.NUM_CELLS), 0xF, dtype=np.uint8)
+        for index, edges in enumerate(engine.WALL_EDGES):
+            for cell, direction in edges:
+                _wall_keep[index, cell] &= ~direction & 0xF
+    return _wall_keep
+
+
+def available():
+    return np is not None
+
+
+def path_lengths(open_dirs, p1, p2, wall_indices):
+    """ Returns (p1_lengths, p2_lengths): each player's shortest-path length (ignoring pawns) to
+    its goal row after each of the given wall slots is placed on its own, UNREACHABLE when cut off.
+    """
+    board_size, unreachable = engine.BOARD_SIZE, engine.UNREACHABLE
+    count = len(wall_indices)
+    board = np.asarray(open_dirs, dtype=np.uint8)
+    walls_open = (board & wall_keep()[np.asarray(wall_indices, dtype=np.intp)]).reshape(count, board_size, board_size)
+    # Rows 0..count-1 measure Player 1 (goal row 0), the rest Player 2 (goal row 8).
+    open_all = np.concatenate((walls_open, walls_open))
+    can_up, can_down = (open_all & engine.UP) != 0, (open_all & engine.DOWN) != 0
+    can_left, can_right = (open_all & engine.LEFT) != 0, (open_all & engine.RIGHT) != 0
+
+    reached = np.zeros((2 * count, board_size, board_size), dtype=bool)
+    reached[:count, engine.PLAYER1_GOAL_ROW, :] = True
+    reached[count:, engine.PLAYER2_GOAL_ROW, :] = True
+    targets = (np.arange(2 * count), np.repeat([p1 // board_size, p2 // board_size], count),
+               np.repeat([p1 % board_size, p2 % board_size], count))
+    lengths = np.full(2 * count, unreachable, dtype=np.int32)
+    lengths[reached[targets]] = 0
+
+    neighbor = np.zeros_like(reached)
+    for step in range(1, board_size * board_size):
+        # A cell is reached once it has an open edge into an already reached neighbour.
+        grown = reached.copy()
+        neighbor[:] = False
+        neighbor[:, 1:, :] = reached[:, :-1, :]
+        grown |= can_up & neighbor
+        neighbor[:] = False
+        neighbor[:, :-1, :] = reached[:, 1:, :]
+        grown |= can_down & neighbor
+        neighbor[:] = False
+        neighbor[:, :, 1:] = reached[:, :, :-1]
+        grown |= can_left & neighbor
+        neighbor[:] = False
+        neighbor[:, :, :-1] = reached[:, :, 1:]
+        grown |= can_right & neighbor
+
+        newly = grown[targets] & (lengths == unreachable)
+        lengths[newly] = step
+        if (lengths != unreachable).all() or (grown == reached).all(): break
+        reached = grown
+    return lengths[:count], lengths[count:]
@@ -0,0 +1,364 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import batch_eval
+from engine import AI, BoardState, H_WALL_BASE, PLAYER1_GOAL_ROW, PLAYER2_GOAL_ROW, UNREACHABLE, WALL_SLOTS, \
+    pawn_moves, path_exists, to_cell
+
+# --- Constants ---
+# Curated search positions: (name, player 1 pos, player 2 pos, player 1 walls, player 2 walls,
+# [(wall_type, (c, r)), ...], player to move). Keep these fixed so node counts stay comparable.
+BENCH_POSITIONS = [
+    ('opening', (4, 8), (4, 0), 10, 10, [], 1),
+    ('early_walls', (4, 6), (4, 2), 8, 8, [('h', (3, 2)), ('h', (4, 5)), ('v', (5, 3)), ('v', (2, 4))], 1),
+    ('midgame', (3, 5), (5, 3), 5, 6,
+     [('h', (0, 3)), ('h', (2, 3)), ('v', (4, 1)), ('h', (5, 5)), ('v', (3, 5)), ('h', (7, 4)),
+      ('v', (6, 2)), ('h', (1, 6)), ('v', (1, 1))], 2),
+    ('corridor', (1, 4), (7, 4), 3, 3,
+     [('h', (0, 2)), ('h', (2, 2)), ('h', (4, 2)), ('v', (6, 2)), ('h', (1, 5)), ('h', (3, 5)),
+      ('h', (5, 5)), ('v', (7, 5)), ('v', (2, 3)), ('v', (5, 3)), ('h', (6, 0)), ('h', (0, 7))], 2),
+    ('race', (4, 3), (4, 5), 1, 0, [('h', (3, 3)), ('v', (4, 4)), ('h', (0, 4)), ('h', (7, 4))], 1),
+]
+PERFT_DEPTHS = {'opening': 3, 'early_walls': 3, 'midgame': 3, 'corridor': 3, 'race': 4}
+PAWN_PERFT_DEPTH = 8
+SEARCH_DEPTH = 5
+BFS_CORPUS_SIZE = 200
+BFS_CORPUS_WALLS = 18
+BFS_REPEATS = 25
+VERIFY_WALL_COUNTS = (4, 10, 18)  # One verification corpus per wall count
+VERIFY_CORPUS_SIZE = 100
+VERIFY_PLIES = 20  # Random moves played from each corpus position when checking make/unmake
+
+
+def build_position(p1_pos, p2_pos, p1_walls, p2_walls, walls):
+    h_walls = v_walls = 0
+    for wall_type, pos in walls:
+        slot = pos[1] * WALL_SLOTS + pos[0]
+        if wall_type == 'h':
+            h_walls |= 1 << slot
+        else:
+            v_walls |= 1 << slot
+    return BoardState(to_cell(p1_pos), to_cell(p2_pos), p1_walls, p2_walls, h_walls, v_walls)
+
+
+def bench_positions():
+    for name, p1_pos, p2_pos, p1_walls, p2_walls, walls, to_move in BENCH_POSITIONS:
+        yield name, build_position(p1_pos, p2_pos, p1_walls, p2_walls, walls), to_move == 2
+
+
+def wall_corpus(size, walls, seed):
+    """ Deterministic wall-heavy positions; every wall keeps both players connected to their goal """
+    rng = random.Random(seed)
+    corpus = []
+    while len(corpus) < size:
+        state = BoardState(to_cell((rng.randrange(9), rng.randrange(1, 9))), to_cell((rng.randrange(9), 0)), 10, 10)
+        if state.p1 == state.p2: continue
+        placed = 0
+        for _ in range(walls * 20):
+            if placed == walls: break
+            index = rng.randrange(128)
+            if not state.can_place_wall(index): continue
+            move = H_WALL_BASE + index
+            undo = state.make_move(placed % 2 == 1, move)
+            if state.dist1[state.p1] == UNREACHABLE or state.dist2[state.p2] == UNREACHABLE:
+                state.unmake_move(placed % 2 == 1, move, undo)
+                continue
+            placed += 1
+        corpus.append(state)
+    return corpus
+
+
+def perft(ai, state, depth, is_p2_turn):
+    """ Counts the move sequences of length depth in the tree the search generates. The generator only
+    offers walls that cut a shortest path, so this is not a count of every legal sequence.
+    """
+    if depth == 0:
+        return 1
+    if is_p2_turn:
+        moves = ai._get_possible_moves(state.p2, state.p1, state.p2_walls, state)
+    else:
+        moves = ai._get_possible_moves(state.p1, state.p2, state.p1_walls, state)
+    count = 0
+    for move in moves:
+        undo = state.make_move(is_p2_turn, move)
+        if move < H_WALL_BASE or (state.dist1[state.p1] != UNREACHABLE and state.dist2[state.p2] != UNREACHABLE):
+            count += perft(ai, state, depth - 1, not is_p2_turn)
+        state.unmake_move(is_p2_turn, move, undo)
+    return count
+
+
+def pawn_perft(state, depth, is_p2_turn):
+    """ Same as perft but over pawn moves only, i.e. calculate_valid_moves """
+    if depth == 0:
+        return 1
+    my_cell, op_cell = (state.p2, state.p1) if is_p2_turn else (state.p1, state.p2)
+    count = 0
+    for move in pawn_moves(state.open_dirs, my_cell, op_cell):
+        undo = state.make_move(is_p2_turn, move)
+        count += pawn_perft(state, depth - 1, not is_p2_turn)
+        state.unmake_move(is_p2_turn, move, undo)
+    return count
+
+
+def run_perft():
+    results = []
+    ai = AI(1)
+    for name, state, is_p2_turn in bench_positions():
+        depth = PERFT_DEPTHS[name]
+        start = time.perf_counter()
+        nodes = perft(ai, state, depth, is_p2_turn)
+        elapsed = time.perf_counter() - start
+        pawn_start = time.perf_counter()
+        pawn_nodes = pawn_perft(state, PAWN_PERFT_DEPTH, is_p2_turn)
+        pawn_elapsed = time.perf_counter() - pawn_start
+        results.append({
+            'position': name, 'depth': depth, 'nodes': nodes, 'seconds': round(elapsed, 4),
+            'nodes_per_second': round(nodes / elapsed) if elapsed else None,
+            'pawn_depth': PAWN_PERFT_DEPTH, 'pawn_nodes': pawn_nodes, 'pawn_seconds': round(pawn_elapsed, 4),
+        })
+    return results
+
+
+def run_bfs(seed):
+    corpus = wall_corpus(BFS_CORPUS_SIZE, BFS_CORPUS_WALLS, seed)
+    ai = AI(1)
+    results = {}
+    checksum = 0
+    start = time.perf_counter()
+    for _ in range(BFS_REPEATS):
+        for state in corpus:
+            checksum += ai.get_shortest_path(state.p1, PLAYER1_GOAL_ROW, state.p2, state)
+            checksum += ai.get_shortest_path(state.p2, PLAYER2_GOAL_ROW, state.p1, state)
+    elapsed = time.perf_counter() - start
+    calls = 2 * BFS_REPEATS * len(corpus)
+    results['get_shortest_path'] = {'calls': calls, 'checksum': checksum, 'seconds': round(elapsed, 4),
+                                    'calls_per_second': round(calls / elapsed)}
+
+    reachable = 0
+    start = time.perf_counter()
+    for _ in range(BFS_REPEATS):
+        for state in corpus:
+            reachable += path_exists(state.open_dirs, state.p1, PLAYER1_GOAL_ROW, state.p2)
+            reachable += path_exists(state.open_dirs, state.p2, PLAYER2_GOAL_ROW, state.p1)
+    elapsed = time.perf_counter() - start
+    results['path_exists'] = {'calls': calls, 'checksum': reachable, 'seconds': round(elapsed, 4),
+                              'calls_per_second': round(calls / elapsed)}
+
+    # Every free slot of every corpus position, so the oracle meets walls of every kind.
+    legal = oracle_calls = 0
+    start = time.perf_counter()
+    for state in corpus:
+        for index in range(2 * WALL_SLOTS * WALL_SLOTS):
+            if not state.can_place_wall(index): continue
+            oracle_calls += 1
+            legal += state.keeps_paths(index)
+    elapsed = time.perf_counter() - start
+    results['keeps_paths'] = {'calls': oracle_calls, 'checksum': legal, 'seconds': round(elapsed, 4),
+                              'calls_per_second': round(oracle_calls / elapsed)}
+    results['corpus'] = {'positions': len(corpus), 'walls': BFS_CORPUS_WALLS, 'seed': seed}
+    return results
+
+
+def run_search(depth):
+    results = []
+    for name, state, is_p2_turn in bench_positions():
+        per_depth = []
+        for current in range(1, depth + 1):
+            # A fresh AI per run so the table starts empty and node counts only depend on the code.
+            ai = AI(2 if is_p2_turn else 1)
+            start = time.perf_counter()
+            move, score = ai.search(state, is_p2_turn, max_depth=current)
+            elapsed = time.perf_counter() - start
+            per_depth.append({'depth': current, 'nodes': ai.nodes, 'seconds': round(elapsed, 4), 'move': move,
+                              'score': score})
+        final = per_depth[-1]
+        results.append({
+            'position': name, 'depth': depth, 'nodes': final['nodes'], 'seconds': final['seconds'],
+            'nodes_per_second': round(final['nodes'] / final['seconds']) if final['seconds'] else None,
+            'best_move': final['move'], 'score': final['score'], 'per_depth': per_depth,
+        })
+    return results
+
+
+def snapshot(state):
+    return (state.p1, state.p2, state.p1_walls, state.p2_walls, state.h_walls, state.v_walls, state.key,
+            state.open_dirs.copy(), state.dist1.copy(), state.dist2.copy())
+
+
+def rebuilt(state):
+    """ snapshot of the same position built from scratch, with no incremental updates behind it """
+    return snapshot(BoardState(state.p1, state.p2, state.p1_walls, state.p2_walls, state.h_walls, state.v_walls))
+
+
+def verify_make_unmake(corpus, seed):
+    """ Plays random moves from each position; after every make_move the key, open edges and distance
+    fields must equal a rebuilt position's, and every unmake_move must restore the position exactly.
+    Walls that cut a path off are made and unmade too, since the search does the same.
+    """
+    rng = random.Random(seed)
+    checked = mismatches = 0
+    for position in corpus:
+        state, is_p2_turn, made = position.copy(), False, []
+        for _ in range(VERIFY_PLIES):
+            my_cell, op_cell = (state.p2, state.p1) if is_p2_turn else (state.p1, state.p2)
+            moves = state.pawn_moves(my_cell, op_cell)
+            if state.p2_walls if is_p2_turn else state.p1_walls:
+                moves += [H_WALL_BASE + index for index in range(2 * WALL_SLOTS * WALL_SLOTS)
+                          if state.can_place_wall(index)]
+            if not moves: break
+            move, before = rng.choice(moves), snapshot(state)
+            undo = state.make_move(is_p2_turn, move)
+            checked += 1
+            mismatches += snapshot(state) != rebuilt(state)
+            if state.dist1[state.p1] == UNREACHABLE or state.dist2[state.p2] == UNREACHABLE:
+                state.unmake_move(is_p2_turn, move, undo)
+                checked += 1
+                mismatches += snapshot(state) != before
+                continue
+            made.append((is_p2_turn, move, undo, before))
+            is_p2_turn = not is_p2_turn
+        for is_p2, move, undo, before in reversed(made):
+            state.unmake_move(is_p2, move, undo)
+            checked += 1
+            mismatches += snapshot(state) != before
+    return {'checked': checked, 'mismatches': mismatches}
+
+
+def verify_batch_eval(corpus):
+    """ batch_eval.path_lengths for every free wall slot must equal placing that wall and reading the
+    repaired distance fields
+    """
+    if not batch_eval.available(): return {'skipped': 'NumPy is not installed'}
+    checked = mismatches = 0
+    for state in corpus:
+        walls = [index for index in range(2 * WALL_SLOTS * WALL_SLOTS) if state.can_place_wall(index)]
+        p1_lengths, p2_lengths = batch_eval.path_lengths(state.open_dirs, state.p1, state.p2, walls)
+        for index, p1_path, p2_path in zip(walls, p1_lengths.tolist(), p2_lengths.tolist()):
+            undo = state.make_move(False, H_WALL_BASE + index)
+            checked += 1
+            mismatches += (p1_path, p2_path) != (state.dist1[state.p1], state.dist2[state.p2])
+            state.unmake_move(False, H_WALL_BASE + index, undo)
+    return {'checked': checked, 'mismatches': mismatches}
+
+
+def verify_keeps_paths(corpus):
+    """ BoardState.keeps_paths for every free wall slot must agree with a position rebuilt with that wall """
+    checked = mismatches = 0
+    for state in corpus:
+        for index in range(2 * WALL_SLOTS * WALL_SLOTS):
+            if not state.can_place_wall(index): continue
+            h_walls, v_walls = state.h_walls, state.v_walls
+            if index < WALL_SLOTS * WALL_SLOTS: h_walls |= 1 << index
+            else: v_walls |= 1 << (index - WALL_SLOTS * WALL_SLOTS)
+            walled = BoardState(state.p1, state.p2, state.p1_walls, state.p2_walls, h_walls, v_walls)
+            checked += 1
+            mismatches += state.keeps_paths(index) != (walled.dist1[walled.p1] != UNREACHABLE and
+                                                       walled.dist2[walled.p2] != UNREACHABLE)
+    return {'checked': checked, 'mismatches': mismatches}
+
+
+def verify_race_pv(corpus):
+    """ A search from a position with no walls left must report a principal variation that starts with its
+    best move, like any other search
+    """
+    checked = mismatches = 0
+    for state in corpus[::10]:
+        if state.is_game_over(): continue
+        race = BoardState(state.p1, state.p2, 0, 0, state.h_walls, state.v_walls)
+        ai = AI(1)
+        move, _ = ai.search(race, False, max_depth=2)
+        checked += 1
+        mismatches += move is None or ai.principal_variation[:1] != [move]
+    return {'checked': checked, 'mismatches': mismatches}
+
+
+def run_verify(seed):
+    """ Checks the incremental search state against from-scratch results; every mismatch is a bug """
+    corpus = [state for walls in VERIFY_WALL_COUNTS for state in wall_corpus(VERIFY_CORPUS_SIZE, walls, seed)]
+    results = {'make_unmake': verify_make_unmake(corpus, seed), 'batch_eval': verify_batch_eval(corpus),
+               'keeps_paths': verify_keeps_paths(corpus), 'race_pv': verify_race_pv(corpus)}
+    results['corpus'] = {'positions': len(corpus), 'walls': VERIFY_WALL_COUNTS, 'seed': seed}
+    return results
+
+
+def measure(section, trace_memory, *args):
+    """ Runs a section once for timing, then again under tracemalloc for its peak memory """
+    result = section(*args)
+    if not trace_memory:
+        return result, None
+    tracemalloc.start()
+    section(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak // 1024
+
+
+def compare(baseline, current):
+    """ Prints speed ratios against an earlier run and flags any node count that changed """
+    def rows(report):
+        for entry in report['perft']:
+            yield 'perft/' + entry['position'], entry['nodes'], entry['seconds']
+        for name in ('get_shortest_path', 'path_exists', 'keeps_paths'):
+            if name not in report['bfs']: continue
+            entry = report['bfs'][name]
+            yield 'bfs/' + name, entry['checksum'], entry['seconds']
+        for entry in report['search']:
+            yield 'search/' + entry['position'], entry['nodes'], entry['seconds']
+
+    old = {name: (nodes, seconds) for name, nodes, seconds in rows(baseline)}
+    for name, nodes, seconds in rows(current):
+        if name not in old: continue
+        old_nodes, old_seconds = old[name]
+        speedup = old_seconds / seconds if seconds else float('inf')
+        flag = '' if old_nodes == nodes else f'  NODES CHANGED {old_nodes} -> {nodes}'
+        print(f"{name:<32}{old_seconds:>10.4f}s{seconds:>10.4f}s{speedup:>8.2f}x{flag}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search's move generation, path search and the AI search.")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="Earlier JSON report to compare this run against")
+    parser.add_argument('--depth', type=int, default=SEARCH_DEPTH, help="Fixed search depth per position")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the wall-heavy BFS corpus")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="Skip the tracemalloc pass (it reruns every section several times slower)")
+    parser.add_argument('--skip', action='append', default=[], choices=['perft', 'bfs', 'search'],
+                        help="Skip a section: perft counts the search's generated move tree (not every legal "
+                             "wall), bfs times path searches, search times fixed-depth searches")
+    parser.add_argument('--verify', action='store_true',
+                        help="Instead of timing anything, check the incremental search state against from-scratch "
+                             "results and exit with status 1 on any mismatch")
+    args = parser.parse_args()
+    if args.verify:
+        results = run_verify(args.seed)
+        print(json.dumps(results, indent=2))
+        sys.exit(1 if any(check.get('mismatches') for check in results.values()) else 0)
+
+    report = {'python': platform.python_version(), 'platform': platform.platform(), 'timestamp': time.time()}
+    memory = {}
+    if 'perft' not in args.skip:
+        report['perft'], memory['perft'] = measure(run_perft, not args.no_memory)
+    if 'bfs' not in args.skip:
+        report['bfs'], memory['bfs'] = measure(run_bfs, not args.no_memory, args.seed)
+    if 'search' not in args.skip:
+        report['search'], memory['search'] = measure(run_search, not args.no_memory, args.depth)
+    report['peak_memory_kb'] = memory
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(json.load(baseline), report)
+
+
+if __name__ == '__main__':
+    main()
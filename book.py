@@ -0,0 +1,101 @@
+import argparse
+import sys
+import time
+from multiprocessing import Pool
+
+from engine import AI, BoardState, OpeningBook, ZOBRIST_P2_TO_MOVE, decode_move
+
+# --- Constants ---
+DEFAULT_PLIES = 4
+DEFAULT_DEPTH = 6
+DEFAULT_OUTPUT = 'opening_book.bin'
+TT_SIZE_MB = 64
+
+
+def search_position(task):
+    """ Runs one fixed-depth search; returns (key, move, score) """
+    key, position, is_p2_turn, depth = task
+    ai = AI(2 if is_p2_turn else 1, TT_SIZE_MB, max_depth=depth)
+    move, score = ai.search(BoardState(*position), is_p2_turn)
+    return key, move, score
+
+
+def expand(state, is_p2_turn, book_move):
+    """ Positions worth covering after state: the book move itself plus every pawn move.
+
+    Walls are only followed when they are the book move; the opponent can always leave the book with a
+    wall, but most opening play is pawn moves and covering every wall would multiply the size many times.
+    """
+    my_cell, op_cell = (state.p2, state.p1) if is_p2_turn else (state.p1, state.p2)
+    moves = state.pawn_moves(my_cell, op_cell)
+    if book_move not in moves: moves.append(book_move)
+    children = []
+    for move in moves:
+        child = state.copy()
+        child.make_move(is_p2_turn, move)
+        children.append(child)
+    return children
+
+
+def build(plies, depth, workers):
+    """ Breadth-first over the opening tree, one parallel batch of searches per ply """
+    entries = {}
+    level = [BoardState.initial()]
+    with Pool(workers) as pool:
+        for ply in range(plies):
+            is_p2_turn = ply % 2 == 1
+            tasks = {}
+            for state in level:
+                key = state.key ^ ZOBRIST_P2_TO_MOVE if is_p2_turn else state.key
+                if key in entries or key in tasks: continue
+                position = (state.p1, state.p2, state.p1_walls, state.p2_walls, state.h_walls, state.v_walls)
+                tasks[key] = (key, position, is_p2_turn, depth)
+
+            start_time = time.time()
+            states = {key: BoardState(*task[1]) for key, task in tasks.items()}
+            next_level = []
+            for key, move, score in pool.imap_unordered(search_position, tasks.values()):
+                if move is None: continue
+                entries[key] = (move, depth, score)
+                next_level.extend(expand(states[key], is_p2_turn, move))
+            print(f"ply {ply + 1}: {len(tasks)} positions in {time.time() - start_time:.1f}s, "
+                  f"{len(entries)} book entries", file=sys.stderr)
+            level = next_level
+    return entries
+
+
+def show(path):
+    """ Prints the book line from the starting position """
+    book = OpeningBook(path)
+    state = BoardState.initial()
+    is_p2_turn = False
+    print(f"{path}: {len(book)} positions")
+    while True:
+        entry = book.probe(state.key ^ ZOBRIST_P2_TO_MOVE if is_p2_turn else state.key)
+        if entry is None or not state.is_legal_move(is_p2_turn, entry[0]): break
+        move, depth, score = entry
+        print(f"Player {2 if is_p2_turn else 1}: {decode_move(move)} (depth {depth}, score {score:g})")
+        state.make_move(is_p2_turn, move)
+        is_p2_turn = not is_p2_turn
+    book.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from deep fixed-depth searches.")
+    parser.add_argument('--plies', type=int, default=DEFAULT_PLIES, help="Opening plies to cover")
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH, help="Search depth for every book position")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--show', action='store_true', help="Print the main line of an existing book and exit")
+    args = parser.parse_args()
+
+    if args.show:
+        show(args.output)
+        return
+    entries = build(args.plies, args.depth, args.workers)
+    OpeningBook.write(args.output, entries)
+    print(f"Wrote {len(entries)} positions to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Exact solver for wall-free Quoridor endgames.
+
+Once neither player has a wall left the board can no longer change, so the game is a pure pawn race
+over the states (player 1 cell, player 2 cell, side to move). RaceTable solves all of them at once by
+retrograde analysis, jumps and side-steps included, and tables are cached per wall configuration.
+"""
+import math
+from array import array
+from collections import OrderedDict, deque
+
+import engine
+
+# --- Constants ---
+RACE_WIN_SCORE = 500  # Search score of a solved race: more than any path-length difference, less than a win
+RACE_CACHE_SIZE = 512  # Solved wall configurations kept in memory (about 26 KB each)
+RACE_SCORE_FLOOR = RACE_WIN_SCORE // 2  # Every race score is further from 0 than this, every evaluation closer
+
+_race_cache = OrderedDict()
+
+
+class RaceTable:
+    """Outcome of every pawn race on one fixed board.
+
+    values[(p1 * 81 + p2) * 2 + turn], with turn 1 when Player 2 is to move, is k + 1 if the side to move
+    wins in k plies with best play, -(k + 1) if it loses in k plies, and 0 if neither side can force a win.
+    """
+    __slots__ = ('open_dirs', 'values')
+
+    def __init__(self, open_dirs):
+        self.open_dirs = open_dirs
+        self.values = self._solve(open_dirs)
+
+    @staticmethod
+    def _solve(open_dirs):
+        num_cells, board_size = engine.NUM_CELLS, engine.BOARD_SIZE
+        p1_goal, p2_goal = engine.PLAYER1_GOAL_ROW, engine.PLAYER2_GOAL_ROW
+        moves = [[engine.pawn_moves(open_dirs, cell, other) if cell != other else () for other in range(num_cells)]
+                 for cell in range(num_cells)]
+
+        values = array('h', bytes(2 * num_cells * num_cells * 2))
+        remaining = array('B', bytes(num_cells * num_cells * 2))
+        predecessors = [[] for _ in range(num_cells * num_cells * 2)]
+        queue = deque()
+        for p1 in range(num_cells):
+            p1_home = p1 // board_size == p1_goal
+            for p2 in range(num_cells):
+                if p1 == p2: continue
+                index = (p1 * num_cells + p2) * 2
+                if p1_home or p2 // board_size == p2_goal:
+                    # Game over: whoever is to move has lost (the other side just reached its goal).
+                    values[index] = values[index + 1] = -1
+                    queue.append(index)
+                    queue.append(index + 1)
+                    continue
+                p1_moves, p2_moves = moves[p1][p2], moves[p2][p1]
+                remaining[index], remaining[index + 1] = len(p1_moves), len(p2_moves)
+                for move in p1_moves: predecessors[(move * num_cells + p2) * 2 + 1].append(index)
+                for move in p2_moves: predecessors[(p1 * num_cells + move) * 2].append(index + 1)
+
+        # Breadth-first from the finished games, so each state is labelled with its fastest win
+        # or slowest loss the moment its last deciding child is seen.
+        while queue:
+            index = queue.popleft()
+            value = values[index]
+            if value < 0:
+                for previous in predecessors[index]:
+                    if values[previous] == 0:
+                        values[previous] = 1 - value
+                        queue.append(previous)
+            else:
+                for previous in predecessors[index]:
+                    if values[previous] == 0:
+                        remaining[previous] -= 1
+                        if remaining[previous] == 0:
+                            values[previous] = -value - 1
+                            queue.append(previous)
+        return values
+
+    def value(self, p1, p2, is_p2_turn):
+        return self.values[(p1 * engine.NUM_CELLS + p2) * 2 + is_p2_turn]
+
+    def best_move(self, p1, p2, is_p2_turn):
+        """ Returns (move, value) for the side to move: the fastest win, else the slowest loss, else a drawing move """
+        num_cells = engine.NUM_CELLS
+        value = self.value(p1, p2, is_p2_turn)
+        best_move, best_key = None, None
+        if is_p2_turn:
+            children = ((move, (p1 * num_cells + move) * 2) for move in engine.pawn_moves(self.open_dirs, p2, p1))
+        else:
+            children = ((move, (move * num_cells + p2) * 2 + 1) for move in engine.pawn_moves(self.open_dirs, p1, p2))
+        for move, child in children:
+            child_value = self.values[child]
+            # From the mover's side a child is worth -child_value; among those, prefer short wins and long losses.
+            if child_value < 0:
+                key = (2, child_value)
+            elif child_value == 0:
+                key = (1, 0)
+            else:
+                key = (0, child_value)
+            if best_key is None or key > best_key: best_move, best_key = move, key
+        return best_move, value
+
+
+def race_table(state):
+    """ Returns the solved RaceTable for state's walls, solving and caching it on first use """
+    walls = (state.h_walls, state.v_walls)
+    table = _race_cache.get(walls)
+    if table is None:
+        table = RaceTable(state.open_dirs.copy())
+        _race_cache[walls] = table
+        if len(_race_cache) > RACE_CACHE_SIZE: _race_cache.popitem(last=False)
+    else:
+        _race_cache.move_to_end(walls)
+    return table
+
+
+def is_cached(state):
+    return (state.h_walls, state.v_walls) in _race_cache
+
+
+def race_score(value, is_p2_turn, ply=0):
+    """ Converts a RaceTable value for the side to move, ply plies into the search, into a score from
+    Player 2's view; counting from the search root makes quicker wins score higher wherever they are found.
+    """
+    if value == 0:
+        return 0
+    plies = abs(value) - 1 + ply
+    score = RACE_WIN_SCORE - plies if value > 0 else plies - RACE_WIN_SCORE
+    return score if is_p2_turn else -score
+
+
+def table_score(score, ply):
+    """ A search score found ply plies into the search as a transposition table entry keeps it: a race
+    score counts its plies from the node itself, so the entry holds wherever the position turns up again.
+    """
+    if RACE_SCORE_FLOOR < abs(score) < math.inf: return score + ply if score > 0 else score - ply
+    return score
+
+
+def search_score(score, ply):
+    """ The inverse of table_score, for an entry probed ply plies into the search """
+    if RACE_SCORE_FLOOR < abs(score) < math.inf: return score - ply if score > 0 else score + ply
+    return score
+
+
+def solve(state, is_p2_turn, ply=0):
+    """ Best move and score for a wall-free position: (move code, score from Player 2's view) """
+    move, value = race_table(state).best_move(state.p1, state.p2, is_p2_turn)
+    return move, race_score(value, is_p2_turn, ply)
@@ -0,0 +1,1208 @@
+from collections import deque
+from heapq import heappush, heappop
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import batch_eval
+import endgame
+
+# --- Constants ---
+# Board Dimensions
+BOARD_SIZE = 9
+PLAYER1_GOAL_ROW = 0
+PLAYER2_GOAL_ROW = BOARD_SIZE - 1
+PLAYER1_START = (4, 8)
+PLAYER2_START = (4, 0)
+WALLS_PER_PLAYER = 10
+
+# Search Settings
+MAX_SEARCH_DEPTH = 9
+BATCH_ORDER_DEPTH = 3  # Nodes at least this far from the leaves order their walls by a batched evaluation
+# Evaluation variants: how many path steps one wall in hand is worth on top of the
+# (opponent path - own path) race score.
+EVALUATION_WALL_WEIGHTS = {'path': 0, 'walls': 1}
+
+
+# Search Encoding
+# Cells are indexed as r * BOARD_SIZE + c and wall slots as r * WALL_SLOTS + c, so the
+# AI can describe a whole position with a handful of ints. Search moves are ints as
+# well: a pawn move is its target cell, a wall move is its slot offset past the cells.
+WALL_SLOTS = BOARD_SIZE - 1
+NUM_CELLS = BOARD_SIZE * BOARD_SIZE
+H_WALL_BASE = NUM_CELLS
+V_WALL_BASE = H_WALL_BASE + WALL_SLOTS * WALL_SLOTS
+
+
+def to_cell(pos):
+    c, r = pos
+    return r * BOARD_SIZE + c
+
+
+def to_pos(cell):
+    return cell % BOARD_SIZE, cell // BOARD_SIZE
+
+
+def wall_index(wall_type, pos):
+    c, r = pos
+    return (0 if wall_type == 'h' else V_WALL_BASE - H_WALL_BASE) + r * WALL_SLOTS + c
+
+
+def encode_move(move):
+    move_type, move_data = move
+    if move_type == 'pawn':
+        return to_cell(move_data)
+    return H_WALL_BASE + wall_index(*move_data)
+
+
+def decode_move(code):
+    if code < H_WALL_BASE:
+        return ('pawn', to_pos(code))
+    wall_type = 'h' if code < V_WALL_BASE else 'v'
+    slot = code - (H_WALL_BASE if wall_type == 'h' else V_WALL_BASE)
+    return ('wall', (wall_type, (slot % WALL_SLOTS, slot // WALL_SLOTS)))
+
+
+# Move Notation
+# Squares are named like chess squares: files a-i from left to right and ranks 1-9 from Player 1's
+# side (row 8) to Player 2's (row 0), so Player 1 starts on e1 and Player 2 on e9. A pawn move is its
+# target square ("e2"); a wall is the square at its top-left plus 'h' or 'v' ("e3h"), so a horizontal
+# wall runs under that square and the one to its right, a vertical wall beside it and the one below.
+# A position is six space-separated fields: Player 1's square, Player 2's square, their walls left,
+# the placed walls joined by commas ('-' for none) and the side to move, e.g. "e1 e9 10 10 - 1".
+FILES = 'abcdefghi'
+
+
+def format_square(cell):
+    c, r = to_pos(cell)
+    return FILES[c] + str(BOARD_SIZE - r)
+
+
+def parse_square(text):
+    if len(text) != 2 or text[0] not in FILES or not '1' <= text[1] <= str(BOARD_SIZE):
+        raise ValueError(f"bad square '{text}'")
+    return to_cell((FILES.index(text[0]), BOARD_SIZE - int(text[1])))
+
+
+def format_move(code):
+    if code < H_WALL_BASE:
+        return format_square(code)
+    _, (wall_type, pos) = decode_move(code)
+    return format_square(to_cell(pos)) + wall_type
+
+
+def parse_move(text):
+    """ Returns the move code for a move in notation; raises ValueError if it names no move """
+    if len(text) == 2:
+        return parse_square(text)
+    if len(text) == 3 and text[2] in 'hv':
+        pos = to_pos(parse_square(text[:2]))
+        if pos[0] < WALL_SLOTS and pos[1] < WALL_SLOTS:
+            return encode_move(('wall', (text[2], pos)))
+    raise ValueError(f"bad move '{text}'")
+
+
+def format_position(state, is_p2_turn):
+    walls = [format_move(H_WALL_BASE + wall_index(wall_type, pos))
+             for wall_type in 'hv' for pos in sorted(state.wall_positions(wall_type), key=to_cell)]
+    return ' '.join((format_square(state.p1), format_square(state.p2), str(state.p1_walls), str(state.p2_walls),
+                     ','.join(walls) or '-', '2' if is_p2_turn else '1'))
+
+
+def parse_position(text):
+    """ Returns (BoardState, is_p2_turn) for a position in notation; raises ValueError if it is malformed
+    or impossible (overlapping walls, pawns on one square, a player walled off from its goal).
+    """
+    fields = text.split()
+    if len(fields) != 6:
+        raise ValueError(f"a position has 6 fields, got {len(fields)}")
+    p1, p2 = parse_square(fields[0]), parse_square(fields[1])
+    if p1 == p2:
+        raise ValueError("both pawns on one square")
+    if not (fields[2].isdigit() and fields[3].isdigit() and
+            int(fields[2]) <= WALLS_PER_PLAYER and int(fields[3]) <= WALLS_PER_PLAYER):
+        raise ValueError(f"walls left must be 0-{WALLS_PER_PLAYER}")
+    if fields[5] not in ('1', '2'):
+        raise ValueError(f"side to move must be 1 or 2, got '{fields[5]}'")
+    h_walls = v_walls = 0
+    for wall in fields[4].split(',') if fields[4] != '-' else ():
+        code = parse_move(wall)
+        if code < H_WALL_BASE:
+            raise ValueError(f"bad wall '{wall}'")
+        h_conflicts, v_conflicts = WALL_CONFLICTS[code - H_WALL_BASE]
+        if h_walls & h_conflicts or v_walls & v_conflicts:
+            raise ValueError(f"wall '{wall}' overlaps another")
+        if code < V_WALL_BASE: h_walls |= 1 << (code - H_WALL_BASE)
+        else: v_walls |= 1 << (code - V_WALL_BASE)
+    state = BoardState(p1, p2, int(fields[2]), int(fields[3]), h_walls, v_walls)
+    if state.dist1[p1] == UNREACHABLE or state.dist2[p2] == UNREACHABLE:
+        raise ValueError("a player has no path to its goal row")
+    return state, fields[5] == '2'
+
+
+# Board Geometry Tables
+# Built once at import. Each cell keeps a 4-bit mask of the directions it can still step
+# in; a wall slot (indexed code - H_WALL_BASE) lists the (cell, direction) edges it cuts
+# and the slots it overlaps, so placing or checking a wall never recomputes geometry.
+UP, DOWN, LEFT, RIGHT = 1, 2, 4, 8
+DIRECTION_DELTAS = ((UP, 0, -1), (DOWN, 0, 1), (LEFT, -1, 0), (RIGHT, 1, 0))
+SIDE_DIRECTIONS = {UP: (LEFT, RIGHT), DOWN: (LEFT, RIGHT), LEFT: (UP, DOWN), RIGHT: (UP, DOWN)}
+
+STEP = [[-1] * (RIGHT + 1) for _ in range(NUM_CELLS)]
+INITIAL_OPEN_DIRS = [0] * NUM_CELLS
+for _cell in range(NUM_CELLS):
+    for _direction, _dc, _dr in DIRECTION_DELTAS:
+        _c, _r = _cell % BOARD_SIZE + _dc, _cell // BOARD_SIZE + _dr
+        if 0 <= _c < BOARD_SIZE and 0 <= _r < BOARD_SIZE:
+            STEP[_cell][_direction] = _r * BOARD_SIZE + _c
+            INITIAL_OPEN_DIRS[_cell] |= _direction
+
+# OPEN_NEIGHBORS[cell][open_mask] -> ((direction, neighbor), ...)
+OPEN_NEIGHBORS = [
+    [tuple((d, STEP[_cell][d]) for d, _, _ in DIRECTION_DELTAS if mask & d) for mask in range(RIGHT * 2)]
+    for _cell in range(NUM_CELLS)
+]
+
+WALL_EDGES = []
+WALL_CONFLICTS = []
+WALL_CONFLICT_SLOTS = []
+for _wall_type in ('h', 'v'):
+    for _r in range(WALL_SLOTS):
+        for _c in range(WALL_SLOTS):
+            _a, _b = _r * BOARD_SIZE + _c, (_r + 1) * BOARD_SIZE + _c + 1
+            if _wall_type == 'h':
+                WALL_EDGES.append(((_a, DOWN), (_a + 1, DOWN), (_b - 1, UP), (_b, UP)))
+                _slots = [('h', (_c + dc, _r)) for dc in (-1, 0, 1)] + [('v', (_c, _r))]
+            else:
+                WALL_EDGES.append(((_a, RIGHT), (_b - 1, RIGHT), (_a + 1, LEFT), (_b, LEFT)))
+                _slots = [('v', (_c, _r + dr)) for dr in (-1, 0, 1)] + [('h', (_c, _r))]
+            _slots = [(t, (c, r)) for t, (c, r) in _slots if 0 <= c < WALL_SLOTS and 0 <= r < WALL_SLOTS]
+            WALL_CONFLICT_SLOTS.append(tuple(_slots))
+            WALL_CONFLICTS.append((
+                sum(1 << (r * WALL_SLOTS + c) for t, (c, r) in _slots if t == 'h'),
+                sum(1 << (r * WALL_SLOTS + c) for t, (c, r) in _slots if t == 'v'),
+            ))
+
+# EDGE_WALLS[(cell, direction)] -> wall slots that cut that edge; EDGE_WALL_MASKS holds the same as a slot bitmask
+EDGE_WALLS = {}
+for _index, _edges in enumerate(WALL_EDGES):
+    for _edge in _edges:
+        EDGE_WALLS.setdefault(_edge, []).append(_index)
+EDGE_WALL_MASKS = {_edge: sum(1 << _index for _index in _indices) for _edge, _indices in EDGE_WALLS.items()}
+
+# Wall Corners
+# Wall ends and midpoints sit on the grid of cell corners, numbered y * CORNERS + x. A wall can
+# only close off a region by joining two corners that walls or the board edge already link, so a
+# wall touching at most one such corner can never take a player's last path away.
+CORNERS = BOARD_SIZE + 1
+BORDER_CORNERS = sum(1 << (_y * CORNERS + _x) for _y in range(CORNERS) for _x in range(CORNERS)
+                     if _x in (0, BOARD_SIZE) or _y in (0, BOARD_SIZE))
+WALL_CORNERS = []  # WALL_CORNERS[index] -> bitmask of the three corners wall slot index covers
+for _wall_type in ('h', 'v'):
+    for _r in range(WALL_SLOTS):
+        for _c in range(WALL_SLOTS):
+            if _wall_type == 'h':
+                WALL_CORNERS.append(sum(1 << ((_r + 1) * CORNERS + _c + _d) for _d in range(3)))
+            else:
+                WALL_CORNERS.append(sum(1 << ((_r + _d) * CORNERS + _c + 1) for _d in range(3)))
+
+
+def apply_wall_edges(open_dirs, index, placed):
+    for cell, direction in WALL_EDGES[index]:
+        if placed:
+            open_dirs[cell] &= ~direction
+        else:
+            open_dirs[cell] |= direction
+
+
+# Distance Fields
+# Per-cell step counts to a goal row, ignoring pawns. Closing edges can only lengthen
+# distances, so a wall only re-derives the cells whose every shortest route it cut.
+UNREACHABLE = 1000
+
+
+def goal_distances(open_dirs, goal_row):
+    dist = [UNREACHABLE] * NUM_CELLS
+    q = deque(range(goal_row * BOARD_SIZE, (goal_row + 1) * BOARD_SIZE))
+    for cell in q: dist[cell] = 0
+    while q:
+        cell = q.popleft()
+        next_dist = dist[cell] + 1
+        for _, neighbor in OPEN_NEIGHBORS[cell][open_dirs[cell]]:
+            if dist[neighbor] == UNREACHABLE:
+                dist[neighbor] = next_dist
+                q.append(neighbor)
+    return dist
+
+
+def repair_distances(dist, open_dirs, cut_edges):
+    """ Update dist in place after cut_edges were closed; returns (cell, old distance) pairs to undo it """
+    candidates = []
+    for cell, direction in cut_edges:
+        if dist[cell] == dist[STEP[cell][direction]] + 1: heappush(candidates, (dist[cell], cell))
+    if not candidates:
+        return []
+
+    # Cells are checked in distance order, so a cell's possible supporters are settled first.
+    affected, checked = set(), set()
+    while candidates:
+        d, cell = heappop(candidates)
+        if cell in checked: continue
+        checked.add(cell)
+        neighbors = OPEN_NEIGHBORS[cell][open_dirs[cell]]
+        if any(dist[neighbor] == d - 1 and neighbor not in affected for _, neighbor in neighbors): continue
+        affected.add(cell)
+        for _, neighbor in neighbors:
+            if dist[neighbor] == d + 1: heappush(candidates, (d + 1, neighbor))
+
+    changed = [(cell, dist[cell]) for cell in affected]
+    frontier = []
+    for cell in affected:
+        best = UNREACHABLE
+        for _, neighbor in OPEN_NEIGHBORS[cell][open_dirs[cell]]:
+            if neighbor not in affected and dist[neighbor] + 1 < best: best = dist[neighbor] + 1
+        dist[cell] = best
+        if best < UNREACHABLE: heappush(frontier, (best, cell))
+    while frontier:
+        d, cell = heappop(frontier)
+        if d > dist[cell]: continue
+        for _, neighbor in OPEN_NEIGHBORS[cell][open_dirs[cell]]:
+            if d + 1 < dist[neighbor]:
+                dist[neighbor] = d + 1
+                heappush(frontier, (d + 1, neighbor))
+    return changed
+
+
+def restore_distances(dist, changed):
+    for cell, d in changed:
+        dist[cell] = d
+
+
+def path_cut_weights(open_dirs, cell, dist):
+    """ Weights of the edges on any shortest path from cell to the goal dist measures: each step
+    between two distance layers shares a weight of 1 among its edges, so a wall set that cuts a
+    whole step (total 1) is certain to lengthen the path and one cutting part of a step may.
+    """
+    weights = {}
+    layer = [cell] if dist[cell] != UNREACHABLE else []
+    while layer:
+        d = dist[layer[0]]
+        if d == 0: break
+        edges, next_layer = [], []
+        for current in layer:
+            for direction, neighbor in OPEN_NEIGHBORS[current][open_dirs[current]]:
+                if dist[neighbor] == d - 1:
+                    edges.append((current, direction))
+                    if neighbor not in next_layer: next_layer.append(neighbor)
+        share = 1 / len(edges)
+        for edge in edges: weights[edge] = share
+        layer = next_layer
+    return weights
+
+
+def path_exists(open_dirs, start_cell, goal_row, opponent_cell):
+    q = deque([start_cell])
+    visited = {start_cell}
+    while q:
+        current_cell = q.popleft()
+        if current_cell // BOARD_SIZE == goal_row: return True
+        for neighbor in pawn_moves(open_dirs, current_cell, opponent_cell):
+            if neighbor not in visited:
+                visited.add(neighbor)
+                q.append(neighbor)
+    return False
+
+
+def pawn_moves(open_dirs, cell, opponent_cell):
+    moves = []
+    for direction, next_cell in OPEN_NEIGHBORS[cell][open_dirs[cell]]:
+        if next_cell != opponent_cell:
+            moves.append(next_cell)
+            continue
+        opponent_open = open_dirs[opponent_cell]
+        if opponent_open & direction:
+            moves.append(STEP[opponent_cell][direction])
+            continue
+        for side in SIDE_DIRECTIONS[direction]:
+            if opponent_open & side: moves.append(STEP[opponent_cell][side])
+    return moves
+
+
+# Zobrist Hashing
+# Fixed seed so position keys are identical across runs.
+_zobrist_rng = random.Random(0x51C0)
+ZOBRIST_P1 = [_zobrist_rng.getrandbits(64) for _ in range(NUM_CELLS)]
+ZOBRIST_P2 = [_zobrist_rng.getrandbits(64) for _ in range(NUM_CELLS)]
+ZOBRIST_WALL = [_zobrist_rng.getrandbits(64) for _ in range(2 * WALL_SLOTS * WALL_SLOTS)]
+ZOBRIST_P1_WALLS = [_zobrist_rng.getrandbits(64) for _ in range(WALLS_PER_PLAYER + 1)]
+ZOBRIST_P2_WALLS = [_zobrist_rng.getrandbits(64) for _ in range(WALLS_PER_PLAYER + 1)]
+ZOBRIST_P2_TO_MOVE = _zobrist_rng.getrandbits(64)
+
+# Transposition Table
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+TT_SIZE_MB = 64
+TT_ENTRY_BYTES = 160  # Rough footprint of one stored entry tuple plus its list slot
+
+# Opening Book
+BOOK_MAGIC = b'QBK1'
+BOOK_HEADER = struct.Struct('<4sI')  # magic, entry count
+BOOK_ENTRY = struct.Struct('<QBBh')  # side-to-move key, move code, search depth, score
+BOOK_SCORE_LIMIT = 32767  # Scores are clamped to int16; a won or lost line is stored at the limit
+
+# Search Control
+NODE_CHECK_INTERVAL = 1024  # Nodes between deadline / stop checks inside minimax
+WORKER_POLL_INTERVAL = 0.05  # Seconds between deadline checks while waiting on a worker process
+ASPIRATION_WINDOW = 1  # Each depth first searches within this many points of the previous depth's score
+ASPIRATION_GROWTH = 4  # A window that fails is widened this many times on the failing side...
+ASPIRATION_LIMIT = 16  # ...and opened completely once wider than this
+
+# Move Ordering
+MAX_PLY = 64  # Plies the per-ply killer and PV tables cover
+NUM_MOVES = V_WALL_BASE + WALL_SLOTS * WALL_SLOTS  # History entries: one per pawn target and wall slot
+HISTORY_DECAY = 2  # History scores are divided by this before each new search
+
+
+class BoardState:
+    """Plain, pygame-free Quoridor position shared by the GUI and the AI search.
+
+    Pawns are cell indices and each wall orientation is a 64-bit mask with one bit per
+    wall slot. The search applies every move in place with make_move and reverts it with
+    unmake_move, which also keep the Zobrist key, open_dirs and the dist1/dist2
+    goal-distance fields up to date, so no child positions are ever allocated.
+    """
+    __slots__ = ('p1', 'p2', 'p1_walls', 'p2_walls', 'h_walls', 'v_walls', 'key', 'open_dirs', 'dist1', 'dist2')
+
+    def __init__(self, p1, p2, p1_walls, p2_walls, h_walls=0, v_walls=0):
+        self.p1 = p1
+        self.p2 = p2
+        self.p1_walls = p1_walls
+        self.p2_walls = p2_walls
+        self.h_walls = h_walls
+        self.v_walls = v_walls
+        self.key = self.compute_key()
+        self.open_dirs = self.compute_open_dirs()
+        self.dist1 = goal_distances(self.open_dirs, PLAYER1_GOAL_ROW)
+        self.dist2 = goal_distances(self.open_dirs, PLAYER2_GOAL_ROW)
+
+    def compute_key(self):
+        key = ZOBRIST_P1[self.p1] ^ ZOBRIST_P2[self.p2]
+        key ^= ZOBRIST_P1_WALLS[self.p1_walls] ^ ZOBRIST_P2_WALLS[self.p2_walls]
+        walls = self.h_walls | self.v_walls << (WALL_SLOTS * WALL_SLOTS)
+        while walls:
+            low_bit = walls & -walls
+            key ^= ZOBRIST_WALL[low_bit.bit_length() - 1]
+            walls ^= low_bit
+        return key
+
+    def compute_open_dirs(self):
+        open_dirs = INITIAL_OPEN_DIRS.copy()
+        walls = self.h_walls | self.v_walls << (WALL_SLOTS * WALL_SLOTS)
+        while walls:
+            low_bit = walls & -walls
+            apply_wall_edges(open_dirs, low_bit.bit_length() - 1, True)
+            walls ^= low_bit
+        return open_dirs
+
+    @classmethod
+    def initial(cls):
+        return cls(to_cell(PLAYER1_START), to_cell(PLAYER2_START), WALLS_PER_PLAYER, WALLS_PER_PLAYER)
+
+    def copy(self):
+        state = BoardState.__new__(BoardState)
+        state.p1, state.p2, state.p1_walls, state.p2_walls = self.p1, self.p2, self.p1_walls, self.p2_walls
+        state.h_walls, state.v_walls, state.key = self.h_walls, self.v_walls, self.key
+        state.open_dirs, state.dist1, state.dist2 = self.open_dirs.copy(), self.dist1.copy(), self.dist2.copy()
+        return state
+
+    def wall_positions(self, wall_type):
+        mask = self.h_walls if wall_type == 'h' else self.v_walls
+        positions = set()
+        while mask:
+            low_bit = mask & -mask
+            slot = low_bit.bit_length() - 1
+            positions.add((slot % WALL_SLOTS, slot // WALL_SLOTS))
+            mask ^= low_bit
+        return positions
+
+    def make_move(self, is_p2, move):
+        if move >= H_WALL_BASE:
+            return self.place_wall(is_p2, move)
+        if is_p2:
+            previous, self.p2 = self.p2, move
+            self.key ^= ZOBRIST_P2[previous] ^ ZOBRIST_P2[move]
+        else:
+            previous, self.p1 = self.p1, move
+            self.key ^= ZOBRIST_P1[previous] ^ ZOBRIST_P1[move]
+        return previous
+
+    def unmake_move(self, is_p2, move, undo):
+        if move >= H_WALL_BASE:
+            self.remove_wall(is_p2, move, undo)
+        elif is_p2:
+            self.p2 = undo
+            self.key ^= ZOBRIST_P2[move] ^ ZOBRIST_P2[undo]
+        else:
+            self.p1 = undo
+            self.key ^= ZOBRIST_P1[move] ^ ZOBRIST_P1[undo]
+
+    def place_wall(self, is_p2, code):
+        index = code - H_WALL_BASE
+        self._toggle_wall(is_p2, index, -1)
+        apply_wall_edges(self.open_dirs, index, True)
+        edges = WALL_EDGES[index]
+        return repair_distances(self.dist1, self.open_dirs, edges), repair_distances(self.dist2, self.open_dirs, edges)
+
+    def remove_wall(self, is_p2, code, undo):
+        index = code - H_WALL_BASE
+        self._toggle_wall(is_p2, index, 1)
+        apply_wall_edges(self.open_dirs, index, False)
+        restore_distances(self.dist1, undo[0])
+        restore_distances(self.dist2, undo[1])
+
+    def _toggle_wall(self, is_p2, index, walls_delta):
+        key = self.key ^ ZOBRIST_WALL[index]
+        if index < V_WALL_BASE - H_WALL_BASE:
+            self.h_walls ^= 1 << index
+        else:
+            self.v_walls ^= 1 << (index - (V_WALL_BASE - H_WALL_BASE))
+        if is_p2:
+            key ^= ZOBRIST_P2_WALLS[self.p2_walls]
+            self.p2_walls += walls_delta
+            key ^= ZOBRIST_P2_WALLS[self.p2_walls]
+        else:
+            key ^= ZOBRIST_P1_WALLS[self.p1_walls]
+            self.p1_walls += walls_delta
+            key ^= ZOBRIST_P1_WALLS[self.p1_walls]
+        self.key = key
+
+    def can_place_wall(self, index):
+        h_conflicts, v_conflicts = WALL_CONFLICTS[index]
+        return not (self.h_walls & h_conflicts or self.v_walls & v_conflicts)
+
+    def pawn_moves(self, cell, opponent_cell):
+        return pawn_moves(self.open_dirs, cell, opponent_cell)
+
+    def is_wall_blocking(self, cell, neighbor_cell):
+        """ Whether a wall stands between two adjacent cells; cells that are not adjacent are never blocked """
+        for direction, neighbor in OPEN_NEIGHBORS[cell][INITIAL_OPEN_DIRS[cell]]:
+            if neighbor == neighbor_cell: return not self.open_dirs[cell] & direction
+        return False
+
+    def is_valid_wall_placement(self, wall_type, pos):
+        c, r = pos
+        return 0 <= c < WALL_SLOTS and 0 <= r < WALL_SLOTS and self.can_place_wall(wall_index(wall_type, pos))
+
+    def wall_corners(self):
+        """ Bitmask of the corners touched by a placed wall or the board edge """
+        corners = BORDER_CORNERS
+        walls = self.h_walls | self.v_walls << (WALL_SLOTS * WALL_SLOTS)
+        while walls:
+            low_bit = walls & -walls
+            corners |= WALL_CORNERS[low_bit.bit_length() - 1]
+            walls ^= low_bit
+        return corners
+
+    def shortest_path_walls(self, cell, dist):
+        """ Bitmask of the wall slots that cut one shortest path from cell to the goal dist measures """
+        mask = 0
+        open_dirs = self.open_dirs
+        while dist[cell]:
+            for direction, neighbor in OPEN_NEIGHBORS[cell][open_dirs[cell]]:
+                if dist[neighbor] == dist[cell] - 1: break
+            mask |= EDGE_WALL_MASKS[(cell, direction)]
+            cell = neighbor
+        return mask
+
+    def keeps_paths(self, index):
+        """ Whether placing the free wall slot index still leaves both players a path to their goal row.
+
+        Most walls are settled without a search: one touching at most one linked corner cannot enclose
+        anything, and one that cuts neither player's current shortest path leaves that path open. Only
+        the rest cut the edges and repair the distance fields, then put both back.
+        """
+        touching = WALL_CORNERS[index] & self.wall_corners()
+        if not touching & (touching - 1): return True
+        if not (self.shortest_path_walls(self.p1, self.dist1) |
+                self.shortest_path_walls(self.p2, self.dist2)) >> index & 1:
+            return True
+        edges = WALL_EDGES[index]
+        apply_wall_edges(self.open_dirs, index, True)
+        changed1 = repair_distances(self.dist1, self.open_dirs, edges)
+        changed2 = repair_distances(self.dist2, self.open_dirs, edges)
+        legal = self.dist1[self.p1] != UNREACHABLE and self.dist2[self.p2] != UNREACHABLE
+        restore_distances(self.dist1, changed1)
+        restore_distances(self.dist2, changed2)
+        apply_wall_edges(self.open_dirs, index, False)
+        return legal
+
+    def is_game_over(self):
+        return self.p1 // BOARD_SIZE == PLAYER1_GOAL_ROW or self.p2 // BOARD_SIZE == PLAYER2_GOAL_ROW
+
+    def is_legal_move(self, is_p2, move):
+        if move < H_WALL_BASE:
+            my_cell, op_cell = (self.p2, self.p1) if is_p2 else (self.p1, self.p2)
+            return move in self.pawn_moves(my_cell, op_cell)
+        if move >= V_WALL_BASE + WALL_SLOTS * WALL_SLOTS or (self.p2_walls if is_p2 else self.p1_walls) == 0:
+            return False
+        return self.can_place_wall(move - H_WALL_BASE) and self.keeps_paths(move - H_WALL_BASE)
+
+
+class TranspositionTable:
+    """Fixed-size table of search results keyed by Zobrist hash.
+
+    Entries live in two-slot buckets: the first slot keeps the deepest result (unless it is
+    left over from an older search), the second always takes the newest one. Scores are
+    stored from Player 2's point of view, the same as minimax returns them, with race scores
+    counted from the stored position rather than the search root (endgame.table_score).
+    """
+
+    def __init__(self, size_mb=TT_SIZE_MB):
+        buckets = max(1, size_mb * 1024 * 1024 // (2 * TT_ENTRY_BYTES))
+        self.bucket_mask = (1 << (buckets.bit_length() - 1)) - 1
+        self.entries = [None] * (2 * (self.bucket_mask + 1))
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * len(self.entries)
+
+    def probe(self, key):
+        index = (key & self.bucket_mask) << 1
+        entry = self.entries[index]
+        if entry is not None and entry[0] == key: return entry
+        entry = self.entries[index + 1]
+        if entry is not None and entry[0] == key: return entry
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        index = (key & self.bucket_mask) << 1
+        entry = (key, depth, bound, score, move, self.generation)
+        deep = self.entries[index]
+        if deep is None or deep[0] == key or deep[1] <= depth or deep[5] != self.generation:
+            self.entries[index] = entry
+        else:
+            self.entries[index + 1] = entry
+
+
+class SearchTimeout(Exception):
+    """Raised inside minimax to unwind the search once its deadline passes or it is stopped."""
+
+
+class OpeningBook:
+    """Read-only opening book: fixed-size entries sorted by position key, searched in a memory map.
+
+    Keys are the same side-to-move keys the transposition table uses. Build the file with book.py.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as book_file:
+            self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = BOOK_HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC or len(self.data) != BOOK_HEADER.size + self.size * BOOK_ENTRY.size:
+            self.data.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    @classmethod
+    def load(cls, path):
+        """ Returns the book at path, or None when there is no file there. Meant for an optional default
+        book; open a path the user gave with OpeningBook(path), which raises when it is wrong.
+        """
+        return cls(path) if path is not None and os.path.exists(path) else None
+
+    @staticmethod
+    def write(path, entries):
+        """ Writes {key: (move, depth, score)} as a book file """
+        with open(path, 'wb') as book_file:
+            book_file.write(BOOK_HEADER.pack(BOOK_MAGIC, len(entries)))
+            for key in sorted(entries):
+                move, depth, score = entries[key]
+                score = int(max(-BOOK_SCORE_LIMIT, min(BOOK_SCORE_LIMIT, score)))
+                book_file.write(BOOK_ENTRY.pack(key, move, depth, score))
+
+    def __len__(self):
+        return self.size
+
+    def probe(self, key):
+        """ Returns (move, depth, score) for a side-to-move key, or None """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            entry = BOOK_ENTRY.unpack_from(self.data, BOOK_HEADER.size + middle * BOOK_ENTRY.size)
+            if entry[0] < key:
+                low = middle + 1
+            elif entry[0] > key:
+                high = middle
+            else:
+                _, move, depth, score = entry
+                if abs(score) == BOOK_SCORE_LIMIT: score = math.copysign(math.inf, score)
+                return move, depth, score
+        return None
+
+    def close(self):
+        self.data.close()
+
+
+# Worker-process side of the parallel search: one AI per process, kept for the pool's lifetime
+# so its transposition table carries over between root moves and turns.
+_worker_ai = None
+
+
+def _init_search_worker(stop_event, tt_size_mb, evaluation):
+    global _worker_ai
+    _worker_ai = AI(0, tt_size_mb, evaluation=evaluation)
+    _worker_ai.stop_event = stop_event
+
+
+def _search_root_move(position, move, depth, alpha, beta, is_p2_turn, deadline, generation):
+    ai = _worker_ai
+    if time.time() > deadline or ai.stop_event.is_set(): return None
+    ai.transposition_table.generation = generation
+    ai.deadline, ai.root_depth, ai.follow_pv = deadline, depth, False
+    ai.reset_counters()
+    state = BoardState(*position)
+    state.make_move(is_p2_turn, move)
+    try:
+        score, _ = ai.minimax(state, depth - 1, alpha, beta, not is_p2_turn)
+    except SearchTimeout:
+        return None
+    return score, ai.counters()
+
+
+class AI:
+    def __init__(self, player_number, tt_size_mb=TT_SIZE_MB, workers=1, max_depth=MAX_SEARCH_DEPTH,
+                 evaluation='path', stats_log=None, book=None, batch=None):
+        self.player_number = player_number
+        self.max_depth = max_depth
+        self.evaluation = evaluation
+        self.wall_weight = EVALUATION_WALL_WEIGHTS[evaluation]
+        self.tt_size_mb = tt_size_mb
+        self.transposition_table = TranspositionTable(tt_size_mb)
+        self.stop_event = threading.Event()
+        self.deadline = math.inf
+        self.node_limit = math.inf  # A search also ends, like at its deadline, once it has visited this many nodes
+        self.reset_counters()
+        self.search_stats = []
+        self.stats_log = stats_log
+        self.on_depth = None  # Called with each search_stats record as soon as its depth ends
+        self.root_depth = 0
+        self.root_best = None
+        # Move ordering state. pv_table[ply] is the best line found from the current node at that ply;
+        # principal_variation is the root's line from the last completed depth, tried first at every ply
+        # while the search follows it. killers[ply] holds the last two moves that caused a cut-off at
+        # that ply, and history[move] how often and how deep a move caused one, aged between searches.
+        self.pv_table = [()] * (MAX_PLY + 1)
+        self.principal_variation = []
+        self.follow_pv = False
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [0] * NUM_MOVES
+        self.current_depth = 0
+        self.workers = workers
+        self.pool = None
+        self.worker_stop_event = None
+        self.ponder = None  # (predicted move, thread, result) while pondering
+        self.book = book  # Optional OpeningBook consulted before searching
+        # NumPy-batched wall ordering; on by default when NumPy is installed, batch=False turns it off
+        self.batch_eval = batch_eval.available() and batch is not False
+
+    def reset_counters(self):
+        self.nodes = 0
+        self.leaf_evals = 0
+        self.bfs_calls = 0
+        self.tt_hits = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def counters(self):
+        return (self.nodes, self.leaf_evals, self.bfs_calls, self.tt_hits, self.beta_cutoffs,
+                self.first_move_cutoffs)
+
+    def add_counters(self, counters):
+        nodes, leaf_evals, bfs_calls, tt_hits, beta_cutoffs, first_move_cutoffs = counters
+        self.nodes += nodes
+        self.leaf_evals += leaf_evals
+        self.bfs_calls += bfs_calls
+        self.tt_hits += tt_hits
+        self.beta_cutoffs += beta_cutoffs
+        self.first_move_cutoffs += first_move_cutoffs
+
+    def stop(self):
+        self.stop_event.set()
+        if self.worker_stop_event is not None: self.worker_stop_event.set()
+
+    def _clear_stop(self):
+        self.stop_event.clear()
+        if self.worker_stop_event is not None: self.worker_stop_event.clear()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def _get_pool(self):
+        if self.pool is None:
+            context = multiprocessing.get_context('spawn')
+            self.worker_stop_event = context.Event()
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                            initializer=_init_search_worker,
+                                            initargs=(self.worker_stop_event, self.tt_size_mb, self.evaluation))
+        return self.pool
+
+    def get_shortest_path(self, start_cell, goal_row, opponent_cell, state):
+        q = deque([(start_cell, 0)])
+        visited = {start_cell}
+        while q:
+            current_cell, dist = q.popleft()
+            if current_cell // BOARD_SIZE == goal_row:
+                return dist
+            for neighbor in pawn_moves(state.open_dirs, current_cell, opponent_cell):
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    q.append((neighbor, dist + 1))
+        return math.inf
+
+    def evaluate_board(self, state):
+        p1_path, p2_path = state.dist1[state.p1], state.dist2[state.p2]
+
+        if p1_path == 0: return -math.inf
+        if p2_path == 0: return math.inf
+
+        if self.wall_weight: return p1_path - p2_path + self.wall_weight * (state.p2_walls - state.p1_walls)
+        return p1_path - p2_path
+
+    def _get_possible_moves(self, player_cell, opponent_cell, walls_left, state):
+        all_moves = state.pawn_moves(player_cell, opponent_cell)
+
+        if walls_left > 0:
+            all_moves.extend(self._wall_moves(state, player_cell == state.p2))
+        return all_moves
+
+    def _wall_moves(self, state, is_p2):
+        """ Free wall slots anywhere on the board that cut a shortest path of either player, most useful first.
+
+        A wall touching neither player's shortest paths changes no distance, so it can only matter a
+        move or more later and is left out. The rest are ranked by how much of the opponent's next
+        steps they cut minus how much of the mover's own.
+        """
+        if is_p2:
+            op_weights = path_cut_weights(state.open_dirs, state.p1, state.dist1)
+            my_weights = path_cut_weights(state.open_dirs, state.p2, state.dist2)
+        else:
+            op_weights = path_cut_weights(state.open_dirs, state.p2, state.dist2)
+            my_weights = path_cut_weights(state.open_dirs, state.p1, state.dist1)
+        gains = {}
+        for weights, sign in ((op_weights, 1), (my_weights, -1)):
+            for edge, weight in weights.items():
+                for index in EDGE_WALLS[edge]:
+                    gains[index] = gains.get(index, 0) + sign * weight
+        ranked = sorted((index for index in gains if state.can_place_wall(index)), key=gains.__getitem__,
+                        reverse=True)
+        return [H_WALL_BASE + index for index in ranked]
+
+    def _ordered_moves(self, state, is_p2_turn, tt_move, depth=0, ply=0, pv_move=None):
+        """ Moves in search order: PV move, table move, the two killers, then the rest by history score """
+        if is_p2_turn:
+            moves = self._get_possible_moves(state.p2, state.p1, state.p2_walls, state)
+        else:
+            moves = self._get_possible_moves(state.p1, state.p2, state.p1_walls, state)
+        # Deep nodes can afford one batch for all their walls: the ones that cut a path are dropped and
+        # the rest tried best-evaluated first. Near the leaves a cut-off usually comes after a few
+        # walls, so placing them one at a time is cheaper there.
+        if self.batch_eval and depth >= BATCH_ORDER_DEPTH:
+            scores = self._batch_wall_scores(state, is_p2_turn, moves)
+            sign = -1 if is_p2_turn else 1
+            moves = [move for move in moves if move < H_WALL_BASE] + sorted(scores, key=lambda move: sign * scores[move])
+        killers = self.killers[ply]
+        first = {}
+        for move in (pv_move, tt_move, killers[0], killers[1]):
+            if move is not None and move not in first: first[move] = len(first) - 4
+        history = self.history
+        # The sort is stable, so moves with equal history keep the order above.
+        moves.sort(key=lambda move: (first.get(move, 0), -history[move]))
+        return moves
+
+    def _record_cutoff(self, move, depth, ply):
+        killers = self.killers[ply]
+        if move != killers[0]: killers[0], killers[1] = move, killers[0]
+        self.history[move] += depth * depth
+
+    def _batch_wall_scores(self, state, is_p2_turn, moves):
+        """ evaluate_board after each wall in moves, for the walls that leave both players a path """
+        walls = [move - H_WALL_BASE for move in moves if move >= H_WALL_BASE]
+        if not walls: return {}
+        self.bfs_calls += 1
+        p1_lengths, p2_lengths = batch_eval.path_lengths(state.open_dirs, state.p1, state.p2, walls)
+        wall_term = 0
+        if self.wall_weight:
+            p1_walls, p2_walls = (state.p1_walls, state.p2_walls - 1) if is_p2_turn else \
+                (state.p1_walls - 1, state.p2_walls)
+            wall_term = self.wall_weight * (p2_walls - p1_walls)
+        scores = {}
+        for index, p1_path, p2_path in zip(walls, p1_lengths.tolist(), p2_lengths.tolist()):
+            if p1_path != UNREACHABLE and p2_path != UNREACHABLE:
+                scores[H_WALL_BASE + index] = p1_path - p2_path + wall_term
+        return scores
+
+    def minimax(self, state, depth, alpha, beta, is_p2_turn):
+        """ Searches state depth plies deep within (alpha, beta); scores are from Player 2's view """
+        if is_p2_turn:
+            return self.negamax(state, depth, alpha, beta, True)
+        score, move = self.negamax(state, depth, -beta, -alpha, False)
+        return -score, move
+
+    def negamax(self, state, depth, alpha, beta, is_p2_turn):
+        """ Principal variation search; scores and the window are from the side to move's view.
+
+        The first move gets the full window. Every later one is first scouted with a null window that
+        only asks whether it beats alpha (scores are whole numbers), and searched in full only if it does.
+        """
+        self.nodes += 1
+        ply = self.root_depth - depth
+        self.pv_table[ply] = ()
+        if not self.nodes % NODE_CHECK_INTERVAL and (time.time() > self.deadline or self.stop_event.is_set() or
+                                                     self.nodes >= self.node_limit):
+            raise SearchTimeout
+        sign = 1 if is_p2_turn else -1
+        game_over = state.is_game_over()
+        if not (game_over or state.p1_walls or state.p2_walls):
+            # No walls left: the rest is a pawn race with an exact, cached answer.
+            self.leaf_evals += 1
+            if not endgame.is_cached(state) and (time.time() > self.deadline or self.stop_event.is_set()):
+                raise SearchTimeout
+            move, score = endgame.solve(state, is_p2_turn, ply)
+            self.pv_table[ply] = (move,) if move is not None else ()
+            return sign * score, move
+        if depth == 0 or game_over:
+            self.leaf_evals += 1
+            return sign * self.evaluate_board(state), None
+
+        key = state.key ^ ZOBRIST_P2_TO_MOVE if is_p2_turn else state.key
+        entry = self.transposition_table.probe(key)
+        tt_move = None
+        if entry is not None:
+            self.tt_hits += 1
+            _, entry_depth, bound, score, tt_move, _ = entry
+            # Only same-depth results cut the search, so a fixed-depth search returns the same
+            # move and score whatever the table already holds (deeper entries still order moves).
+            if entry_depth == depth and tt_move is not None:
+                # The table keeps Player 2's view, so for Player 1 a lower bound turns into an upper one.
+                score = sign * endgame.search_score(score, ply)
+                if bound == TT_EXACT: return score, tt_move
+                if bound == (TT_LOWER if is_p2_turn else TT_UPPER): alpha = max(alpha, score)
+                else: beta = min(beta, score)
+                if beta <= alpha: return score, tt_move
+        alpha_orig, beta_orig = alpha, beta
+        on_pv = self.follow_pv
+        pv_move = self.principal_variation[ply] if on_pv and ply < len(self.principal_variation) else None
+
+        best_score, best_move = -math.inf, None
+        for i, move in enumerate(self._ordered_moves(state, is_p2_turn, tt_move, depth, ply, pv_move)):
+            undo = state.make_move(is_p2_turn, move)
+            if move >= H_WALL_BASE: self.bfs_calls += 1
+            if move >= H_WALL_BASE and (state.dist1[state.p1] == UNREACHABLE or
+                                        state.dist2[state.p2] == UNREACHABLE):
+                score = -math.inf
+            else:
+                self.follow_pv = on_pv and move == pv_move
+                if i == 0 or alpha == -math.inf:
+                    score = -self.negamax(state, depth - 1, -beta, -alpha, not is_p2_turn)[0]
+                else:
+                    score = -self.negamax(state, depth - 1, -alpha - 1, -alpha, not is_p2_turn)[0]
+                    if alpha < score < beta:
+                        score = -self.negamax(state, depth - 1, -beta, -alpha, not is_p2_turn)[0]
+            state.unmake_move(is_p2_turn, move, undo)
+            if score > best_score:
+                best_score, best_move = score, move
+                self.pv_table[ply] = (move,) + self.pv_table[ply + 1]
+                # At the root only a move that beat the window's lower edge has a usable score.
+                if depth == self.root_depth and score > alpha_orig: self.root_best = (sign * score, move)
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                self.beta_cutoffs += 1
+                if i == 0: self.first_move_cutoffs += 1
+                self._record_cutoff(move, depth, ply)
+                break
+        if is_p2_turn:
+            self._store(key, depth, best_score, best_move, alpha_orig, beta_orig, ply)
+        else:
+            self._store(key, depth, -best_score, best_move, -beta_orig, -alpha_orig, ply)
+        return best_score, best_move
+
+    def _store(self, key, depth, score, best_move, alpha, beta, ply):
+        if score <= alpha:
+            bound = TT_UPPER
+        elif score >= beta:
+            bound = TT_LOWER
+        else:
+            bound = TT_EXACT
+        self.transposition_table.store(key, depth, bound, endgame.table_score(score, ply), best_move)
+
+    def _search_root_parallel(self, state, depth, is_p2_turn):
+        """ Searches the first (previous best) root move here, then the rest in worker processes.
+
+        The others are searched with the first move's score as their bound, so each one either
+        proves it is no better or returns its exact score; picking the first strict improvement in move order
+        gives the same move and score as the sequential search at the same depth.
+        """
+        key = state.key ^ ZOBRIST_P2_TO_MOVE if is_p2_turn else state.key
+        entry = self.transposition_table.probe(key)
+        pv_move = self.principal_variation[0] if self.principal_variation else None
+        moves = [move for move in self._ordered_moves(state, is_p2_turn, entry[4] if entry is not None else None,
+                                                      depth, 0, pv_move)
+                 if move < H_WALL_BASE or state.keeps_paths(move - H_WALL_BASE)]
+        if not moves:
+            # No legal move loses, as in the sequential search.
+            return (-math.inf if is_p2_turn else math.inf), None
+
+        first_move = moves[0]
+        undo = state.make_move(is_p2_turn, first_move)
+        self.follow_pv = first_move == pv_move
+        try:
+            best_score, _ = self.minimax(state, depth - 1, -math.inf, math.inf, not is_p2_turn)
+        finally:
+            state.unmake_move(is_p2_turn, first_move, undo)
+        best_move = first_move
+        self.root_best = (best_score, best_move)
+        self.pv_table[0] = (first_move,) + self.pv_table[1]
+
+        alpha, beta = (best_score, math.inf) if is_p2_turn else (-math.inf, best_score)
+        position = (state.p1, state.p2, state.p1_walls, state.p2_walls, state.h_walls, state.v_walls)
+        pool = self._get_pool()
+        futures = [pool.submit(_search_root_move, position, move, depth, alpha, beta, is_p2_turn, self.deadline,
+                               self.transposition_table.generation) for move in moves[1:]]
+        timed_out = False
+        for move, future in zip(moves[1:], futures):
+            result = None if timed_out and future.cancel() else self._wait_for(future)
+            if result is None:
+                timed_out = True
+                continue
+            score, counters = result
+            self.add_counters(counters)
+            if score > best_score if is_p2_turn else score < best_score:
+                best_score, best_move = score, move
+                self.root_best = (best_score, best_move)
+                self.pv_table[0] = (move,)  # The rest of the line stayed in the worker
+        if timed_out: raise SearchTimeout
+
+        self.transposition_table.store(key, depth, TT_EXACT, best_score, best_move)
+        return best_score, best_move
+
+    def _wait_for(self, future):
+        # Workers were handed the deadline at submit time, but pondering can move it afterwards.
+        while True:
+            try:
+                return future.result(timeout=WORKER_POLL_INTERVAL)
+            except FutureTimeout:
+                if time.time() > self.deadline or self.stop_event.is_set():
+                    self.worker_stop_event.set()
+                    return None
+
+    def search(self, state, is_p2_turn, time_limit=math.inf, max_depth=None):
+        self.deadline = time.time() + time_limit
+        return self._iterative_deepening(state, is_p2_turn, max_depth)
+
+    def _iterative_deepening(self, state, is_p2_turn, max_depth=None):
+        # Runs until self.deadline, which another thread may still change (see ponder_hit).
+        max_depth = self.max_depth if max_depth is None else max_depth
+        self.reset_counters()
+        self.search_stats = []
+        best_move_overall = None
+        final_score = 0
+        self.transposition_table.new_search()
+        self._new_search_ordering()
+
+        for depth in range(1, max_depth + 1):
+            if time.time() > self.deadline or self.stop_event.is_set() or self.nodes >= self.node_limit: break
+            self.current_depth = depth
+            self.root_depth, self.root_best = depth, None
+            counters_before, start_time = self.counters(), time.time()
+
+            try:
+                if self.workers > 1:
+                    score_at_depth, best_move_at_depth = self._search_root_parallel(state, depth, is_p2_turn)
+                else:
+                    score_at_depth, best_move_at_depth = self._aspiration_search(state, depth, is_p2_turn,
+                                                                                 self._aspiration_guess(depth))
+            except SearchTimeout:
+                # The first root move is the previous best, so a partial iteration is still sound
+                # once that move has been searched in full.
+                if self.root_best is not None: final_score, best_move_overall = self.root_best
+                self._record_depth(depth, counters_before, start_time, False, best_move_overall, final_score)
+                break
+
+            best_move_overall = best_move_at_depth
+            final_score = score_at_depth
+            self.principal_variation = list(self.pv_table[0])
+            self._record_depth(depth, counters_before, start_time, True, best_move_overall, final_score)
+        if self.stats_log is not None: self._log_stats(state, is_p2_turn)
+        return best_move_overall, final_score
+
+    def _aspiration_guess(self, depth):
+        # Scores swing with whichever side moved last, so the depth two back (same side last) is the
+        # better guess; before that there is only the previous depth, and at depth 1 nothing at all.
+        if depth > 2: return self.search_stats[depth - 3]['score']
+        if depth > 1: return self.search_stats[depth - 2]['score']
+        return math.inf
+
+    def _aspiration_search(self, state, depth, is_p2_turn, guess):
+        """ Searches the root within a narrow window around guess, the previous depth's score; a result
+        outside the window is only a bound, so the search is repeated with that side widened.
+        """
+        below = above = ASPIRATION_WINDOW if math.isfinite(guess) else math.inf
+        while True:
+            # An open side stays infinite: a won or lost guess minus an infinite margin would be NaN.
+            alpha = guess - below if below != math.inf else -math.inf
+            beta = guess + above if above != math.inf else math.inf
+            self.follow_pv = True
+            score, move = self.minimax(state, depth, alpha, beta, is_p2_turn)
+            if score <= alpha and below != math.inf:
+                below = below * ASPIRATION_GROWTH if below * ASPIRATION_GROWTH <= ASPIRATION_LIMIT else math.inf
+            elif score >= beta and above != math.inf:
+                above = above * ASPIRATION_GROWTH if above * ASPIRATION_GROWTH <= ASPIRATION_LIMIT else math.inf
+            else:
+                return score, move
+
+    def _new_search_ordering(self):
+        # Killers are tied to plies from the root, which shift every move; history is only aged.
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [score // HISTORY_DECAY for score in self.history]
+        self.principal_variation = []
+
+    def _record_depth(self, depth, counters_before, start_time, completed, move, score):
+        nodes, leaf_evals, bfs_calls, tt_hits, beta_cutoffs, first_move_cutoffs = (
+            now - before for now, before in zip(self.counters(), counters_before))
+        previous = self.search_stats[-1]['nodes'] if self.search_stats else 0
+        self.search_stats.append({
+            'depth': depth,
+            'completed': completed,
+            'nodes': nodes,
+            'leaf_evals': leaf_evals,
+            'bfs_calls': bfs_calls,
+            'tt_hits': tt_hits,
+            'beta_cutoffs': beta_cutoffs,
+            'first_move_cutoff_rate': first_move_cutoffs / beta_cutoffs if beta_cutoffs else None,
+            # Effective branching factor: how many times more nodes this iteration took than the last one
+            'ebf': nodes / previous if previous and completed else None,
+            'seconds': time.time() - start_time,
+            'move': move,
+            'score': score,
+            'pv': self.principal_variation if completed else None,
+        })
+        if self.on_depth is not None: self.on_depth(self.search_stats[-1])
+
+    def _log_stats(self, state, is_p2_turn):
+        record = {
+            'time': time.time(),
+            'player': 2 if is_p2_turn else 1,
+            'position': [state.p1, state.p2, state.p1_walls, state.p2_walls, state.h_walls, state.v_walls],
+            'evaluation': self.evaluation,
+            'workers': self.workers,
+            # JSON has no infinity, so a won or lost line is logged at the limit, as in the book and game records.
+            'depths': [dict(entry, score=max(-BOOK_SCORE_LIMIT, min(BOOK_SCORE_LIMIT, entry['score'])))
+                       for entry in self.search_stats],
+        }
+        with open(self.stats_log, 'a') as log:
+            log.write(json.dumps(record, allow_nan=False) + '\n')
+
+    def book_move(self, position):
+        """ Returns (move code, score) from the opening book if it has a legal move for this position """
+        if self.book is None: return None
+        is_p2_turn = self.player_number == 2
+        entry = self.book.probe(position.key ^ ZOBRIST_P2_TO_MOVE if is_p2_turn else position.key)
+        if entry is None or not position.is_legal_move(is_p2_turn, entry[0]): return None
+        return entry[0], entry[2]
+
+    def _best_move(self, position):
+        is_p2_turn = self.player_number == 2
+        state = position.copy()
+        book_hit = self.book_move(state)
+        if book_hit is not None:
+            self.reset_counters()
+            self.search_stats, self.current_depth = [], 0
+            return decode_move(book_hit[0]), book_hit[1]
+        best_move, score = self._iterative_deepening(state, is_p2_turn)
+        if best_move is None:
+            my_cell, op_cell = (position.p2, position.p1) if is_p2_turn else (position.p1, position.p2)
+            fallback_moves = position.pawn_moves(my_cell, op_cell)
+            if fallback_moves: best_move = fallback_moves[0]
+        return (decode_move(best_move) if best_move is not None else None), score
+
+    def _start_search_thread(self, position):
+        result = {}
+
+        def search_thread():
+            result['move'], result['score'] = self._best_move(position)
+
+        thread = threading.Thread(target=search_thread)
+        thread.start()
+        return thread, result
+
+    def find_best_move(self, position, time_limit):
+        """ Searches position for this AI's player and returns (move, score) in the GUI's move format """
+        self._clear_stop()
+        self.deadline = time.time() + time_limit
+        return self._best_move(position)
+
+    def find_best_move_async(self, position, time_limit):
+        """ Runs find_best_move on a background thread; returns the thread and the dict it fills in """
+        self._clear_stop()
+        self.deadline = time.time() + time_limit
+        return self._start_search_thread(position.copy())
+
+    def predict_reply(self, position):
+        """ Guesses the opponent's next move: the table's best move if it is still legal, else a shortest-path step """
+        opponent_is_p2 = self.player_number != 2
+        key = position.key ^ ZOBRIST_P2_TO_MOVE if opponent_is_p2 else position.key
+        entry = self.transposition_table.probe(key)
+        if entry is not None and entry[4] is not None and position.is_legal_move(opponent_is_p2, entry[4]):
+            return entry[4]
+        op_cell, my_cell, op_dist = (position.p2, position.p1, position.dist2) if opponent_is_p2 else \
+            (position.p1, position.p2, position.dist1)
+        return min(position.pawn_moves(op_cell, my_cell), key=op_dist.__getitem__, default=None)
+
+    def start_pondering(self, position):
+        """ Searches the position after the opponent's predicted reply on a background thread, with no deadline.
+
+        Call it once this AI has moved; ponder_hit then either hands over the running search or stops it.
+        """
+        self.stop_pondering()
+        if position.is_game_over(): return
+        predicted = self.predict_reply(position)
+        if predicted is None: return
+        state = position.copy()
+        state.make_move(self.player_number != 2, predicted)
+        self._clear_stop()
+        self.deadline = math.inf
+        self.ponder = (predicted, *self._start_search_thread(state))
+
+    def ponder_hit(self, move, time_limit):
+        """ Reports the opponent's actual move (a move code) while pondering.
+
+        On a correct prediction the ponder search keeps going, now with time_limit from this call, and
+        (thread, result) is returned exactly like find_best_move_async. Otherwise the ponder search is
+        stopped and None is returned; its table entries still help the fresh search.
+        """
+        if self.ponder is None: return None
+        predicted, thread, result = self.ponder
+        self.ponder = None
+        if move == predicted:
+            self.deadline = time.time() + time_limit
+            return thread, result
+        self.stop()
+        thread.join()
+        return None
+
+    def stop_pondering(self):
+        if self.ponder is None: return
+        _, thread, _ = self.ponder
+        self.ponder = None
+        self.stop()
+        thread.join()
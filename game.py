@@ -1,10 +1,12 @@
 import pygame
 import sys
-from collections import deque
 import math
-import threading
 import time
 import os
+from engine import (AI, BoardState, OpeningBook, BOARD_SIZE, PLAYER1_GOAL_ROW, PLAYER2_GOAL_ROW, encode_move, to_cell, to_pos,
+                    pawn_moves, wall_index)
+from mcts import MCTS
+from records import GameWriter
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -36,171 +38,67 @@ SCREEN_HEIGHT = 750
 HUD_HEIGHT = 100
 
 # Board Dimensions
-BOARD_SIZE = 9
 SQUARE_SIZE = SCREEN_WIDTH // (BOARD_SIZE + 1)
 WALL_THICKNESS = SQUARE_SIZE // 5
 BOARD_OFFSET_X = SQUARE_SIZE // 2
 BOARD_OFFSET_Y = SQUARE_SIZE // 2 + HUD_HEIGHT
 
+# Hit-testing
+# Every SQUARE_SIZE pixels along an axis hold a square (SQUARE_SIZE - WALL_THICKNESS wide) followed by
+# a gutter (WALL_THICKNESS wide); walls lie in the gutters and span two squares plus the gutter between.
+
+
+def axis_cell(offset):
+    """ (index, inside the gutter) of the square whose period holds this pixel offset from the board edge """
+    index, within = divmod(offset, SQUARE_SIZE)
+    return index, within >= SQUARE_SIZE - WALL_THICKNESS
+
+
+def square_at(pixel_pos):
+    """ The (col, row) square under a pixel, or None over a gutter or off the board """
+    x, y = pixel_pos[0] - BOARD_OFFSET_X, pixel_pos[1] - BOARD_OFFSET_Y
+    if x < 0 or y < 0: return None
+    (col, col_gutter), (row, row_gutter) = axis_cell(x), axis_cell(y)
+    if col >= BOARD_SIZE or row >= BOARD_SIZE or col_gutter or row_gutter: return None
+    return col, row
+
+
+def wall_start(index, in_gutter):
+    # A wall starting at slot s covers squares s and s + 1; over a square the lower slot wins.
+    if not in_gutter and index >= 1: index -= 1
+    return index if index < BOARD_SIZE - 1 else None
 
-class AI:
-    def __init__(self, game, player_number):
-        self.game = game
-        self.player_number = player_number
-        self.move_order_cache = []
-
-    def is_valid_wall_in_sim(self, wall_type, pos, h_walls, v_walls):
-        c, r = pos
-        if not (0 <= c < BOARD_SIZE - 1 and 0 <= r < BOARD_SIZE - 1):
-            return False
-        if wall_type == 'h':
-            if (c, r) in h_walls or (c - 1, r) in h_walls or (c + 1, r) in h_walls: return False
-            if (c, r) in v_walls: return False
-        elif wall_type == 'v':
-            if (c, r) in v_walls or (c, r - 1) in v_walls or (c, r + 1) in v_walls: return False
-            if (c, r) in h_walls: return False
-        return True
-
-    def get_shortest_path(self, start_pos, goal_row, opponent_pos, h_walls, v_walls):
-        q = deque([(start_pos, 0)])
-        visited = {start_pos}
-        original_h, original_v = self.game.horizontal_walls, self.game.vertical_walls
-        self.game.horizontal_walls, self.game.vertical_walls = h_walls, v_walls
-        path_dist = math.inf
-        while q:
-            current_pos, dist = q.popleft()
-            if current_pos[1] == goal_row:
-                path_dist = dist
-                break
-            for neighbor in self.game.calculate_valid_moves(current_pos, opponent_pos):
-                if neighbor not in visited:
-                    visited.add(neighbor)
-                    q.append((neighbor, dist + 1))
-        self.game.horizontal_walls, self.game.vertical_walls = original_h, original_v
-        return path_dist
-
-    def evaluate_board(self, p1_pos, p2_pos, p1_walls, p2_walls, h_walls, v_walls):
-        p1_path = self.get_shortest_path(p1_pos, self.game.player1_goal_row, p2_pos, h_walls, v_walls)
-        p2_path = self.get_shortest_path(p2_pos, self.game.player2_goal_row, p1_pos, h_walls, v_walls)
-
-        if p1_path == 0: return -math.inf
-        if p2_path == 0: return math.inf
-
-        return p1_path - p2_path
-
-    def _get_possible_moves(self, player_pos, opponent_pos, walls_left, h_walls, v_walls):
-        pawn_moves = self.game.calculate_valid_moves(player_pos, opponent_pos)
-        all_moves = [('pawn', move) for move in pawn_moves]
-
-        if walls_left > 0:
-            oc, or_ = opponent_pos
-            for r_offset in range(-2, 3):
-                for c_offset in range(-2, 3):
-                    h_pos, v_pos = (oc + c_offset, or_ + r_offset), (oc + c_offset, or_ + r_offset)
-                    if self.is_valid_wall_in_sim('h', h_pos, h_walls, v_walls):
-                        all_moves.append(('wall', ('h', h_pos)))
-                    if self.is_valid_wall_in_sim('v', v_pos, h_walls, v_walls):
-                        all_moves.append(('wall', ('v', v_pos)))
-        return all_moves
-
-    def minimax(self, p1_pos, p2_pos, p1_walls, p2_walls, h_walls, v_walls, depth, alpha, beta, is_p2_turn):
-        is_game_over = p1_pos[1] == self.game.player1_goal_row or p2_pos[1] == self.game.player2_goal_row
-        if depth == 0 or is_game_over:
-            return self.evaluate_board(p1_pos, p2_pos, p1_walls, p2_walls, h_walls, v_walls), None
-
-        best_move = None
-        if is_p2_turn:
-            max_eval = -math.inf
-            moves = self._get_possible_moves(p2_pos, p1_pos, p2_walls, h_walls, v_walls)
-            if self.move_order_cache: moves.sort(key=lambda m: self.move_order_cache[0] == m, reverse=True)
-            for move_type, move_data in moves:
-                h_copy, v_copy = h_walls.copy(), v_walls.copy()
-                if move_type == 'pawn':
-                    eval_val, _ = self.minimax(p1_pos, move_data, p1_walls, p2_walls, h_copy, v_copy, depth - 1, alpha,
-                                               beta, False)
-                else:
-                    wall_type, pos = move_data
-                    if wall_type == 'h':
-                        h_copy.add(pos)
-                    else:
-                        v_copy.add(pos)
-                    p1_path = self.get_shortest_path(p1_pos, self.game.player1_goal_row, p2_pos, h_copy, v_copy)
-                    p2_path = self.get_shortest_path(p2_pos, self.game.player2_goal_row, p1_pos, h_copy, v_copy)
-                    if p1_path == math.inf or p2_path == math.inf:
-                        eval_val = -math.inf
-                    else:
-                        eval_val, _ = self.minimax(p1_pos, p2_pos, p1_walls, p2_walls - 1, h_copy, v_copy, depth - 1,
-                                                   alpha, beta, False)
-                if eval_val > max_eval: max_eval, best_move = eval_val, (move_type, move_data)
-                alpha = max(alpha, eval_val)
-                if beta <= alpha: break
-            return max_eval, best_move
-        else:
-            min_eval = math.inf
-            moves = self._get_possible_moves(p1_pos, p2_pos, p1_walls, h_walls, v_walls)
-            if self.move_order_cache: moves.sort(key=lambda m: self.move_order_cache[0] == m, reverse=True)
-            for move_type, move_data in moves:
-                h_copy, v_copy = h_walls.copy(), v_walls.copy()
-                if move_type == 'pawn':
-                    eval_val, _ = self.minimax(move_data, p2_pos, p1_walls, p2_walls, h_copy, v_copy, depth - 1, alpha,
-                                               beta, True)
-                else:
-                    wall_type, pos = move_data
-                    if wall_type == 'h':
-                        h_copy.add(pos)
-                    else:
-                        v_copy.add(pos)
-                    p1_path = self.get_shortest_path(p1_pos, self.game.player1_goal_row, p2_pos, h_copy, v_copy)
-                    p2_path = self.get_shortest_path(p2_pos, self.game.player2_goal_row, p1_pos, h_copy, v_copy)
-                    if p1_path == math.inf or p2_path == math.inf:
-                        eval_val = math.inf
-                    else:
-                        eval_val, _ = self.minimax(p1_pos, p2_pos, p1_walls - 1, p2_walls, h_copy, v_copy, depth - 1,
-                                                   alpha, beta, True)
-                if eval_val < min_eval: min_eval, best_move = eval_val, (move_type, move_data)
-                beta = min(beta, eval_val)
-                if beta <= alpha: break
-            return min_eval, best_move
-
-    def find_best_move(self, time_limit):
-        is_p2_turn = self.player_number == 2
-
-        def minimax_wrapper(result_container):
-            start_time = time.time()
-            p1_pos, p2_pos = self.game.player1_pos, self.game.player2_pos
-            p1_walls, p2_walls = self.game.player1_walls, self.game.player2_walls
-            h_walls, v_walls = self.game.horizontal_walls, self.game.vertical_walls
-            best_move_overall = None
-            final_score = 0
-
-            for depth in range(1, 10):
-                self.game.ai_search_depth = depth
-                if time.time() - start_time > time_limit: break
-
-                score_at_depth, best_move_at_depth = self.minimax(p1_pos, p2_pos, p1_walls, p2_walls, h_walls.copy(), v_walls.copy(),
-                                                     depth, -math.inf, math.inf, is_p2_turn)
-
-                if time.time() - start_time > time_limit:
-                    if best_move_at_depth is not None: best_move_overall = best_move_at_depth
-                    break
-
-                best_move_overall = best_move_at_depth
-                final_score = score_at_depth
-                self.move_order_cache = [best_move_at_depth]
-
-            if best_move_overall is None:
-                my_pos = p2_pos if is_p2_turn else p1_pos
-                op_pos = p1_pos if is_p2_turn else p2_pos
-                possible_moves = self.game.calculate_valid_moves(my_pos, op_pos)
-                if possible_moves: best_move_overall = ('pawn', possible_moves[0])
-
-            result_container['move'] = best_move_overall
-            result_container['score'] = final_score
-
-        result = {}
-        thread = threading.Thread(target=minimax_wrapper, args=(result,))
-        thread.start()
-        self.game.ai_thread_container[self.player_number] = {'thread': thread, 'result_dict': result}
+
+def wall_at(pixel_pos):
+    """ The ('h' | 'v', (c, r)) wall slot under a pixel, or None; horizontal walls win where gutters cross """
+    x, y = pixel_pos[0] - BOARD_OFFSET_X, pixel_pos[1] - BOARD_OFFSET_Y
+    if x < 0 or y < 0: return None
+    (col, col_gutter), (row, row_gutter) = axis_cell(x), axis_cell(y)
+    if row_gutter and row < BOARD_SIZE - 1:
+        c = wall_start(col, col_gutter)
+        if c is not None: return 'h', (c, row)
+    if col_gutter and col < BOARD_SIZE - 1:
+        r = wall_start(row, row_gutter)
+        if r is not None: return 'v', (col, r)
+    return None
+
+
+# Rendering
+FPS = 60
+AI_THINKING_FPS = 15  # Frame rate while an AI searches, leaving the search thread more of the interpreter
+SPINNER_DEGREES_PER_SECOND = 900
+TEXT_CACHE_SIZE = 256  # Rendered strings kept; the cache is emptied when it grows past this
+
+# AI Settings
+AI_TIME_LIMIT = 3
+AI_WORKERS = 1  # Search processes per AI; above 1 the root moves are split across a process pool
+PLAYER1_ENGINE = 'minimax'  # 'minimax' (alpha-beta, engine.py) or 'mcts' (Monte Carlo Tree Search, mcts.py)
+PLAYER2_ENGINE = 'minimax'
+OPENING_BOOK = 'opening_book.bin'  # Built with book.py; the AI searches every move when the file is missing
+AI_PONDER = True  # In Player vs AI, keep the AI searching the predicted reply during the human's turn
+SHOW_SEARCH_STATS = False  # Per-depth search statistics overlay; toggle in game with S
+SEARCH_STATS_LOG = None  # Path of a JSONL file that receives the statistics of every AI search
+GAME_RECORDS = None  # Path of a game record file (see records.py) that every game is appended to, move by move
 
 
 class Game:
@@ -216,6 +114,7 @@ class Game:
             self.hud_font = pygame.font.Font(font_path, 32)
             self.small_hud_font = pygame.font.Font(font_path, 28)
             self.game_over_font = pygame.font.Font(font_path, 60)
+            self.stats_font = pygame.font.Font(font_path, 18)
         except FileNotFoundError:
             print("Font file not found, using default system font.")
             self.title_font = pygame.font.SysFont("georgia", 80)
@@ -223,22 +122,25 @@ class Game:
             self.hud_font = pygame.font.SysFont("segoeui", 32)
             self.small_hud_font = pygame.font.SysFont("segoeui", 28)
             self.game_over_font = pygame.font.SysFont("segoeui", 60)
+            self.stats_font = pygame.font.SysFont("consolas", 18)
         self.game_state = 'main_menu'
         self.game_mode = None
         self.pvp_button = pygame.Rect(150, 250, 300, 60)
         self.pvai_button = pygame.Rect(150, 350, 300, 60)
         self.aivai_button = pygame.Rect(150, 450, 300, 60)
-        self.ai_player1 = AI(self, 1)
-        self.ai_player2 = AI(self, 2)
+        self.opening_book = OpeningBook.load(resource_path(OPENING_BOOK))
+        self.ai_player1 = self.create_ai(1, PLAYER1_ENGINE)
+        self.ai_player2 = self.create_ai(2, PLAYER2_ENGINE)
+        self.show_search_stats = SHOW_SEARCH_STATS
         self.ai_is_thinking = False
         self.ai_thread_container = {}
         self.ai_start_time = 0
         self.ai_time_taken = 0
         self.ai_time_display_end_time = 0
         self.thinking_animation_angle = 0
-        self.ai_search_depth = 0
         self.pulse_animation_timer = 0
         self.ghost_wall = None
+        self.ghost_validity = (None, False)
         self.board_evaluation = 0.0
         board_pixel_height = (BOARD_SIZE * (SQUARE_SIZE - WALL_THICKNESS)) + ((BOARD_SIZE - 1) * WALL_THICKNESS)
         self.eval_bar_rect = pygame.Rect(
@@ -247,71 +149,155 @@ class Game:
             25,  # Width of the bar
             board_pixel_height  # Exact height of the board
         )
+        self.board_rect = pygame.Rect(BOARD_OFFSET_X, BOARD_OFFSET_Y, board_pixel_height, board_pixel_height)
         self.animating = False
         self.animation_target_pos = None
         self.animating_pawn_pixels = [0, 0]
         self.animation_player = None
+        # Render caches: the board with its walls is redrawn only when the walls change, text only
+        # when its string does, and the display only updates where something moved (dirty_rects)
+        # unless frame_key() reports a change anywhere else.
+        self.board_layer = None
+        self.board_layer_walls = None
+        self.text_cache = {}
+        self.stats_panel = (None, None)
+        self.last_frame_key = None
+        self.dirty_rects = []
+        self.records = GameWriter(GAME_RECORDS) if GAME_RECORDS is not None else None
         self.reset_game()
 
+    def create_ai(self, player_number, engine):
+        if engine == 'mcts': return MCTS(player_number, workers=AI_WORKERS)
+        return AI(player_number, workers=AI_WORKERS, stats_log=SEARCH_STATS_LOG, book=self.opening_book)
+
     def reset_game(self):
-        self.player1_pos = (4, 8)
-        self.player2_pos = (4, 0)
-        self.player1_walls = 10
-        self.player2_walls = 10
-        self.horizontal_walls = set()
-        self.vertical_walls = set()
+        self.position = BoardState.initial()
         self.current_player = 1
         self.selected_pawn = None
         self.valid_moves = []
-        self.player1_goal_row = 0
-        self.player2_goal_row = 8
+        self.player1_goal_row = PLAYER1_GOAL_ROW
+        self.player2_goal_row = PLAYER2_GOAL_ROW
         self.error_message = ""
         self.error_message_end_time = 0
         self.winner = None
         self.game_over = False
+        self.stats_ai = None
+        self.pondered_search = None
+        self.turn_start_time = time.time()
+        # A game is recorded from its first move, so opening the menu doesn't leave empty games behind.
+        self.recording = False
+
+    def player_settings(self, player):
+        is_ai = self.game_mode == 'aivai' or (self.game_mode == 'pvai' and player == 2)
+        if not is_ai: return {'engine': 'human'}
+        ai = self.ai_player1 if player == 1 else self.ai_player2
+        if isinstance(ai, MCTS):
+            return {'engine': 'mcts', 'time': AI_TIME_LIMIT, 'workers': AI_WORKERS}
+        return {'engine': 'minimax', 'time': AI_TIME_LIMIT, 'workers': AI_WORKERS, 'depth': ai.max_depth,
+                'eval': ai.evaluation, 'book': OPENING_BOOK if ai.book is not None else None,
+                'ponder': AI_PONDER and self.game_mode == 'pvai'}
+
+    def record_move(self, move, search=None):
+        """ Appends a move to the game record; search is the AI that chose it, if one did """
+        if self.records is None: return
+        if not self.recording:
+            self.records.start_game({'source': 'game', 'mode': self.game_mode, 'started': time.time(),
+                                     'players': [self.player_settings(1), self.player_settings(2)]})
+            self.recording = True
+        depth, score = 0, None
+        if search is not None:
+            depths = [entry['depth'] for entry in search.search_stats if entry['completed']]
+            depth, score = (depths[-1] if depths else 0), self.board_evaluation
+        self.records.write_move(encode_move(move), depth, score, time.time() - self.turn_start_time)
+        self.turn_start_time = time.time()
+
+    # The board itself lives in self.position; these views keep the drawing code readable.
+    @property
+    def player1_pos(self):
+        return to_pos(self.position.p1)
+
+    @property
+    def player2_pos(self):
+        return to_pos(self.position.p2)
+
+    @property
+    def player1_walls(self):
+        return self.position.p1_walls
+
+    @property
+    def player2_walls(self):
+        return self.position.p2_walls
+
+    @property
+    def horizontal_walls(self):
+        return self.position.wall_positions('h')
+
+    @property
+    def vertical_walls(self):
+        return self.position.wall_positions('v')
+
+    @property
+    def ai_search_depth(self):
+        return (self.ai_player1 if self.current_player == 1 else self.ai_player2).current_depth
+
+    def render_text(self, font, text, color):
+        key = (font, text, color)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            if len(self.text_cache) >= TEXT_CACHE_SIZE: self.text_cache.clear()
+            surface = self.text_cache[key] = font.render(text, True, color)
+        return surface
 
     def draw_main_menu(self):
         self.screen.fill(BROWN)
         mouse_pos = pygame.mouse.get_pos()
-        title_text = self.title_font.render("Quoridor", True, WHITE)
+        title_text = self.render_text(self.title_font, "Quoridor", WHITE)
         title_rect = title_text.get_rect(center=(SCREEN_WIDTH / 2, 120))
         self.screen.blit(title_text, title_rect)
         pvp_color = BUTTON_HOVER_COLOR if self.pvp_button.collidepoint(mouse_pos) else BUTTON_COLOR
         pygame.draw.rect(self.screen, pvp_color, self.pvp_button, border_radius=10)
-        pvp_text = self.font.render("Player vs Player", True, WHITE)
+        pvp_text = self.render_text(self.font, "Player vs Player", WHITE)
         pvp_text_rect = pvp_text.get_rect(center=self.pvp_button.center)
         self.screen.blit(pvp_text, pvp_text_rect)
         pvai_color = BUTTON_HOVER_COLOR if self.pvai_button.collidepoint(mouse_pos) else BUTTON_COLOR
         pygame.draw.rect(self.screen, pvai_color, self.pvai_button, border_radius=10)
-        pvai_text = self.font.render("Player vs AI", True, WHITE)
+        pvai_text = self.render_text(self.font, "Player vs AI", WHITE)
         pvai_text_rect = pvai_text.get_rect(center=self.pvai_button.center)
         self.screen.blit(pvai_text, pvai_text_rect)
         aivai_color = BUTTON_HOVER_COLOR if self.aivai_button.collidepoint(mouse_pos) else BUTTON_COLOR
         pygame.draw.rect(self.screen, aivai_color, self.aivai_button, border_radius=10)
-        aivai_text = self.font.render("AI vs AI", True, WHITE)
+        aivai_text = self.render_text(self.font, "AI vs AI", WHITE)
         aivai_text_rect = aivai_text.get_rect(center=self.aivai_button.center)
         self.screen.blit(aivai_text, aivai_text_rect)
 
     def draw_board(self):
-        self.screen.fill(BROWN)
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                x = BOARD_OFFSET_X + col * SQUARE_SIZE
-                y = BOARD_OFFSET_Y + row * SQUARE_SIZE
-                rect = pygame.Rect(x, y, SQUARE_SIZE - WALL_THICKNESS, SQUARE_SIZE - WALL_THICKNESS)
-                pygame.draw.rect(self.screen, LIGHT_BROWN, rect)
-
-    def draw_walls(self):
+        # The background, squares and walls only change when a wall is placed, so they are drawn
+        # once into a layer that every frame starts from.
+        walls = (self.position.h_walls, self.position.v_walls)
+        if self.board_layer is None or self.board_layer_walls != walls:
+            self.board_layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.board_layer.fill(BROWN)
+            for row in range(BOARD_SIZE):
+                for col in range(BOARD_SIZE):
+                    x = BOARD_OFFSET_X + col * SQUARE_SIZE
+                    y = BOARD_OFFSET_Y + row * SQUARE_SIZE
+                    rect = pygame.Rect(x, y, SQUARE_SIZE - WALL_THICKNESS, SQUARE_SIZE - WALL_THICKNESS)
+                    pygame.draw.rect(self.board_layer, LIGHT_BROWN, rect)
+            self.draw_walls(self.board_layer)
+            self.board_layer_walls = walls
+        self.screen.blit(self.board_layer, (0, 0))
+
+    def draw_walls(self, surface):
         for c, r in self.horizontal_walls:
             x = BOARD_OFFSET_X + c * SQUARE_SIZE
             y = BOARD_OFFSET_Y + r * SQUARE_SIZE + (SQUARE_SIZE - WALL_THICKNESS)
             rect = pygame.Rect(x, y, SQUARE_SIZE * 2 - WALL_THICKNESS, WALL_THICKNESS)
-            pygame.draw.rect(self.screen, WALL_COLOR, rect)
+            pygame.draw.rect(surface, WALL_COLOR, rect)
         for c, r in self.vertical_walls:
             x = BOARD_OFFSET_X + c * SQUARE_SIZE + (SQUARE_SIZE - WALL_THICKNESS)
             y = BOARD_OFFSET_Y + r * SQUARE_SIZE
             rect = pygame.Rect(x, y, WALL_THICKNESS, SQUARE_SIZE * 2 - WALL_THICKNESS)
-            pygame.draw.rect(self.screen, WALL_COLOR, rect)
+            pygame.draw.rect(surface, WALL_COLOR, rect)
 
     def draw_ghost_wall(self):
         if self.ghost_wall:
@@ -321,9 +307,7 @@ class Game:
             # Create a semi-transparent surface for the ghost wall
             ghost_surface = pygame.Surface((SQUARE_SIZE * 2, SQUARE_SIZE * 2), pygame.SRCALPHA)
 
-            # Check if this placement would be valid before drawing
-            is_valid = self.is_valid_wall_placement(wall_type, pos) and (
-                self.player1_walls if self.current_player == 1 else self.player2_walls) > 0
+            is_valid = self.ghost_wall_valid()
 
             # Green for valid, Red for invalid
             ghost_color = (65, 105, 225, 120) if is_valid else (220, 20, 60, 120)
@@ -339,9 +323,22 @@ class Game:
 
             pygame.draw.rect(self.screen, ghost_color, rect, border_radius=3)
 
+    def ghost_wall_valid(self):
+        # The answer only changes when the hovered slot, the position or the side to move does, so it is
+        # recomputed on those changes rather than every frame.
+        walls_left = self.player1_walls if self.current_player == 1 else self.player2_walls
+        key = (self.ghost_wall, self.position.key, self.current_player, walls_left)
+        if self.ghost_validity[0] != key:
+            wall_type, pos = self.ghost_wall
+            is_valid = walls_left > 0 and self.is_valid_wall_placement(wall_type, pos) and \
+                self.position.keeps_paths(wall_index(wall_type, pos))
+            self.ghost_validity = (key, is_valid)
+        return self.ghost_validity[1]
+
     def draw_pawns(self):
         # --- Draw Player 1 ---
         # If P1 is animating, draw it at its current pixel position
+        if self.animating: self.dirty_rects.append(self.board_rect)
         if self.animating and self.animation_player == 1:
             pygame.draw.circle(self.screen, PLAYER1_COLOR, self.animating_pawn_pixels, SQUARE_SIZE / 3)
         else:  # Otherwise, draw it at its normal grid position
@@ -384,112 +381,31 @@ class Game:
 
             # The color is now a constant gold
             pygame.draw.rect(self.screen, HIGHLIGHT_COLOR, rect, 3, border_radius=5)
+            self.dirty_rects.append(pygame.Rect(x, y, SQUARE_SIZE - WALL_THICKNESS, SQUARE_SIZE - WALL_THICKNESS))
 
     def get_square_from_pos(self, mouse_pos):
-        mouse_x, mouse_y = mouse_pos
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                x = BOARD_OFFSET_X + col * SQUARE_SIZE
-                y = BOARD_OFFSET_Y + row * SQUARE_SIZE
-                rect = pygame.Rect(x, y, SQUARE_SIZE - WALL_THICKNESS, SQUARE_SIZE - WALL_THICKNESS)
-                if rect.collidepoint(mouse_x, mouse_y):
-                    return (col, row)
-        return None
+        return square_at(mouse_pos)
 
     def get_wall_from_pos(self, mouse_pos):
-        mouse_x, mouse_y = mouse_pos
-        for r in range(BOARD_SIZE - 1):
-            for c in range(BOARD_SIZE - 1):
-                x = BOARD_OFFSET_X + c * SQUARE_SIZE
-                y = BOARD_OFFSET_Y + r * SQUARE_SIZE + (SQUARE_SIZE - WALL_THICKNESS)
-                rect = pygame.Rect(x, y, SQUARE_SIZE * 2 - WALL_THICKNESS, WALL_THICKNESS)
-                if rect.collidepoint(mouse_x, mouse_y):
-                    return ('h', (c, r))
-        for r in range(BOARD_SIZE - 1):
-            for c in range(BOARD_SIZE - 1):
-                x = BOARD_OFFSET_X + c * SQUARE_SIZE + (SQUARE_SIZE - WALL_THICKNESS)
-                y = BOARD_OFFSET_Y + r * SQUARE_SIZE
-                rect = pygame.Rect(x, y, WALL_THICKNESS, SQUARE_SIZE * 2 - WALL_THICKNESS)
-                if rect.collidepoint(mouse_x, mouse_y):
-                    return ('v', (c, r))
-        return None
+        return wall_at(mouse_pos)
 
     def calculate_valid_moves(self, pawn_pos, opponent_pos):
-        moves = []
-        c, r = pawn_pos
-        oc, or_ = opponent_pos
-        for dc, dr in [(0, -1), (0, 1), (-1, 0), (1, 0)]:
-            next_pos = (c + dc, r + dr)
-            if self.is_wall_blocking(pawn_pos, next_pos): continue
-            if next_pos == opponent_pos:
-                jump_pos = (oc + dc, or_ + dr)
-                if self.is_wall_blocking(opponent_pos, jump_pos) or not (
-                        0 <= jump_pos[0] < BOARD_SIZE and 0 <= jump_pos[1] < BOARD_SIZE):
-                    if dc == 0:
-                        if not self.is_wall_blocking(opponent_pos,
-                                                     (oc - 1, or_)) and 0 <= oc - 1 < BOARD_SIZE: moves.append(
-                            (oc - 1, or_))
-                        if not self.is_wall_blocking(opponent_pos,
-                                                     (oc + 1, or_)) and 0 <= oc + 1 < BOARD_SIZE: moves.append(
-                            (oc + 1, or_))
-                    else:
-                        if not self.is_wall_blocking(opponent_pos,
-                                                     (oc, or_ - 1)) and 0 <= or_ - 1 < BOARD_SIZE: moves.append(
-                            (oc, or_ - 1))
-                        if not self.is_wall_blocking(opponent_pos,
-                                                     (oc, or_ + 1)) and 0 <= or_ + 1 < BOARD_SIZE: moves.append(
-                            (oc, or_ + 1))
-                else:
-                    moves.append(jump_pos)
-                continue
-            if 0 <= next_pos[0] < BOARD_SIZE and 0 <= next_pos[1] < BOARD_SIZE: moves.append(next_pos)
-        return list(set(moves))
-
-    def path_exists(self, start_pos, goal_row, opponent_pos):
-        q = deque([start_pos])
-        visited = {start_pos}
-        while q:
-            current_pos = q.popleft()
-            if current_pos[1] == goal_row: return True
-            for neighbor in self.calculate_valid_moves(current_pos, opponent_pos):
-                if neighbor not in visited:
-                    visited.add(neighbor);
-                    q.append(neighbor)
-        return False
+        return [to_pos(cell) for cell in pawn_moves(self.position.open_dirs, to_cell(pawn_pos), to_cell(opponent_pos))]
 
     def is_wall_blocking(self, start_pos, end_pos):
-        sc, sr = start_pos;
-        ec, er = end_pos
-        if abs(sc - ec) + abs(sr - er) > 1: return False
-        if sc == ec:
-            if er < sr:
-                return (sc, er) in self.horizontal_walls or (sc - 1, er) in self.horizontal_walls
-            else:
-                return (sc, sr) in self.horizontal_walls or (sc - 1, sr) in self.horizontal_walls
-        if sr == er:
-            if ec < sc:
-                return (ec, sr) in self.vertical_walls or (ec, sr - 1) in self.vertical_walls
-            else:
-                return (sc, sr) in self.vertical_walls or (sc, sr - 1) in self.vertical_walls
-        return False
+        return self.position.is_wall_blocking(to_cell(start_pos), to_cell(end_pos))
 
     def is_valid_wall_placement(self, wall_type, pos):
-        c, r = pos
-        if wall_type == 'h':
-            if (c, r) in self.horizontal_walls or (c - 1, r) in self.horizontal_walls or (
-            c + 1, r) in self.horizontal_walls: return False
-            if (c, r) in self.vertical_walls: return False
-        elif wall_type == 'v':
-            if (c, r) in self.vertical_walls or (c, r - 1) in self.vertical_walls or (
-            c + 1, r) in self.vertical_walls: return False
-            if (c, r) in self.horizontal_walls: return False
-        return True
+        return self.position.is_valid_wall_placement(wall_type, pos)
 
 
     def draw_hud(self):
         p1_hud_area = pygame.Rect(0, 0, SCREEN_WIDTH / 3, HUD_HEIGHT)
         p2_hud_area = pygame.Rect(SCREEN_WIDTH * 2 / 3, 0, SCREEN_WIDTH / 3, HUD_HEIGHT)
 
+        # The spinner turns with the clock rather than per frame, since the frame rate drops while the AI thinks.
+        self.thinking_animation_angle = -pygame.time.get_ticks() * SPINNER_DEGREES_PER_SECOND / 1000 % 360
+
         # --- Determine AI thinking status ---
         is_p1_thinking = self.ai_is_thinking and self.current_player == 1 and self.game_mode == 'aivai'
         is_p2_thinking = self.ai_is_thinking and self.current_player == 2 and self.game_mode in ['pvai', 'aivai']
@@ -497,10 +413,10 @@ class Game:
         # --- Player 1 HUD ---
         if is_p1_thinking:
             # Show "Thinking..." status for Player 1
-            thinking_text = self.hud_font.render("Thinking...", True, PLAYER1_COLOR)
+            thinking_text = self.render_text(self.hud_font, "Thinking...", PLAYER1_COLOR)
             thinking_rect = thinking_text.get_rect(center=(p1_hud_area.centerx, 30))
             self.screen.blit(thinking_text, thinking_rect)
-            depth_text = self.small_hud_font.render(f"Depth: {self.ai_search_depth}", True, WHITE)
+            depth_text = self.render_text(self.small_hud_font, f"Depth: {self.ai_search_depth}", WHITE)
             depth_rect = depth_text.get_rect(center=(p1_hud_area.centerx, 70))
             self.screen.blit(depth_text, depth_rect)
             # Rotating arc animation for P1
@@ -510,23 +426,23 @@ class Game:
             start_angle = math.radians(self.thinking_animation_angle)
             end_angle = math.radians(self.thinking_animation_angle + 270)
             pygame.draw.arc(self.screen, PLAYER1_COLOR, arc_rect, start_angle, end_angle, 3)
-            self.thinking_animation_angle = (self.thinking_animation_angle - 15) % 360
+            self.dirty_rects.append(arc_rect)
         else:
             # Show standard info for Player 1
-            p1_title_text = self.hud_font.render("Player 1", True, PLAYER1_COLOR)
+            p1_title_text = self.render_text(self.hud_font, "Player 1", PLAYER1_COLOR)
             p1_title_rect = p1_title_text.get_rect(center=(p1_hud_area.centerx, 30))
             self.screen.blit(p1_title_text, p1_title_rect)
-            p1_wall_text = self.small_hud_font.render(f"Walls: {self.player1_walls}", True, WHITE)
+            p1_wall_text = self.render_text(self.small_hud_font, f"Walls: {self.player1_walls}", WHITE)
             p1_wall_rect = p1_wall_text.get_rect(center=(p1_hud_area.centerx, 70))
             self.screen.blit(p1_wall_text, p1_wall_rect)
 
         # --- Player 2 HUD ---
         if is_p2_thinking:
             # Show "Thinking..." status for Player 2
-            thinking_text = self.hud_font.render("Thinking...", True, PLAYER2_COLOR)
+            thinking_text = self.render_text(self.hud_font, "Thinking...", PLAYER2_COLOR)
             thinking_rect = thinking_text.get_rect(center=(p2_hud_area.centerx, 30))
             self.screen.blit(thinking_text, thinking_rect)
-            depth_text = self.small_hud_font.render(f"Depth: {self.ai_search_depth}", True, WHITE)
+            depth_text = self.render_text(self.small_hud_font, f"Depth: {self.ai_search_depth}", WHITE)
             depth_rect = depth_text.get_rect(center=(p2_hud_area.centerx, 70))
             self.screen.blit(depth_text, depth_rect)
             # Rotating arc animation for P2
@@ -536,13 +452,13 @@ class Game:
             start_angle = math.radians(self.thinking_animation_angle)
             end_angle = math.radians(self.thinking_animation_angle + 270)
             pygame.draw.arc(self.screen, PLAYER2_COLOR, arc_rect, start_angle, end_angle, 3)
-            self.thinking_animation_angle = (self.thinking_animation_angle - 15) % 360
+            self.dirty_rects.append(arc_rect)
         else:
             # Show standard info for Player 2
-            p2_title_text = self.hud_font.render("Player 2", True, PLAYER2_COLOR)
+            p2_title_text = self.render_text(self.hud_font, "Player 2", PLAYER2_COLOR)
             p2_title_rect = p2_title_text.get_rect(center=(p2_hud_area.centerx, 30))
             self.screen.blit(p2_title_text, p2_title_rect)
-            p2_wall_text = self.small_hud_font.render(f"Walls: {self.player2_walls}", True, WHITE)
+            p2_wall_text = self.render_text(self.small_hud_font, f"Walls: {self.player2_walls}", WHITE)
             p2_wall_rect = p2_wall_text.get_rect(center=(p2_hud_area.centerx, 70))
             self.screen.blit(p2_wall_text, p2_wall_rect)
 
@@ -553,10 +469,30 @@ class Game:
             else:
                 pygame.draw.circle(self.screen, HIGHLIGHT_COLOR, (p2_hud_area.left + 25, 30), 8)
 
+    def draw_search_stats(self):
+        if not self.show_search_stats or self.stats_ai is None: return
+        lines = ["Depth      Nodes    EBF   Cut@1     ms"]
+        for entry in list(self.stats_ai.search_stats):
+            ebf = f"{entry['ebf']:.1f}" if entry['ebf'] is not None else "-"
+            cut_rate = entry['first_move_cutoff_rate']
+            cut_text = f"{100 * cut_rate:.0f}%" if cut_rate is not None else "-"
+            marker = "" if entry['completed'] else "*"
+            lines.append(f"{str(entry['depth']) + marker:>5}{entry['nodes']:>11}{ebf:>7}{cut_text:>8}"
+                         f"{1000 * entry['seconds']:>7.0f}")
+        cached_lines, panel = self.stats_panel
+        if cached_lines != lines:
+            line_height = self.stats_font.get_linesize()
+            panel = pygame.Surface((260, line_height * len(lines) + 10), pygame.SRCALPHA)
+            panel.fill((0, 0, 0, 170))
+            for i, line in enumerate(lines):
+                panel.blit(self.stats_font.render(line, True, WHITE), (8, 5 + i * line_height))
+            self.stats_panel = (lines, panel)
+        self.screen.blit(panel, (SCREEN_WIDTH - panel.get_width() - 10, BOARD_OFFSET_Y))
+
     def draw_error_message(self):
         current_time = pygame.time.get_ticks()
         if current_time < self.error_message_end_time:
-            error_text = self.hud_font.render(self.error_message, True, ERROR_COLOR)
+            error_text = self.render_text(self.hud_font, self.error_message, ERROR_COLOR)
             error_rect = error_text.get_rect(center=(SCREEN_WIDTH / 2, HUD_HEIGHT - 20))
             self.screen.blit(error_text, error_rect)
 
@@ -567,11 +503,11 @@ class Game:
         self.screen.blit(overlay, (0, 0))
         winner_text_str = f"Player {self.winner} Wins!"
         winner_color = PLAYER1_COLOR if self.winner == 1 else PLAYER2_COLOR
-        winner_text = self.game_over_font.render(winner_text_str, True, winner_color)
+        winner_text = self.render_text(self.game_over_font, winner_text_str, winner_color)
         winner_rect = winner_text.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 50))
         self.screen.blit(winner_text, winner_rect)
         restart_text_str = "Click to Return to Menu"
-        restart_text = self.font.render(restart_text_str, True, WHITE)
+        restart_text = self.render_text(self.font, restart_text_str, WHITE)
         restart_rect = restart_text.get_rect(center=(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 50))
         self.screen.blit(restart_text, restart_rect)
 
@@ -602,6 +538,62 @@ class Game:
         pygame.draw.rect(self.screen, PLAYER1_COLOR, p1_bar_rect)
         pygame.draw.rect(self.screen, PLAYER2_COLOR, p2_bar_rect)
 
+    def frame_key(self):
+        """ Everything the picture depends on apart from the animations that report their own dirty rects """
+        if self.game_state == 'main_menu':
+            mouse_pos = pygame.mouse.get_pos()
+            return ('main_menu', tuple(button.collidepoint(mouse_pos)
+                                       for button in (self.pvp_button, self.pvai_button, self.aivai_button)))
+        stats = self.stats_ai.search_stats if self.show_search_stats and self.stats_ai is not None else None
+        return (self.game_state, self.position.key, self.current_player, self.ai_is_thinking,
+                self.ai_search_depth if self.ai_is_thinking else None, self.board_evaluation, self.ghost_wall,
+                self.selected_pawn, pygame.time.get_ticks() < self.error_message_end_time, self.error_message,
+                self.show_search_stats, id(stats), len(stats) if stats is not None else 0, self.winner)
+
+    def draw_frame(self):
+        """ Redraws and updates the whole display when frame_key changes, otherwise only the animated parts """
+        frame_key = self.frame_key()
+        animated = self.game_state == 'playing' and (self.animating or self.valid_moves or self.ai_is_thinking)
+        if frame_key == self.last_frame_key and not animated: return
+        self.dirty_rects = []
+        if self.game_state == 'main_menu':
+            self.draw_main_menu()
+        elif self.game_state == 'playing' or self.game_state == 'game_over':
+            self.draw_board()
+            if self.game_state == 'playing': self.draw_valid_moves()
+            self.draw_ghost_wall()
+            self.draw_pawns()
+            self.draw_hud()
+            self.draw_error_message()
+            self.draw_search_stats()
+            if self.game_state == 'game_over': self.draw_game_over_screen()
+            self.draw_evaluation_bar()
+        if frame_key != self.last_frame_key:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.dirty_rects)
+        self.last_frame_key = frame_key
+
+    def cancel_ai_search(self):
+        for ai in (self.ai_player1, self.ai_player2):
+            ai.stop_pondering()
+            ai.stop()
+        for thread_info in self.ai_thread_container.values(): thread_info['thread'].join()
+        if self.pondered_search is not None: self.pondered_search[0].join()
+        self.ai_thread_container = {}
+        self.pondered_search = None
+        self.ai_is_thinking = False
+
+    def report_move_to_ponderer(self, move):
+        # Only the Player vs AI opponent (player 2) ponders, so any move it hears about is the human's.
+        if self.ai_player2.ponder is not None:
+            self.pondered_search = self.ai_player2.ponder_hit(encode_move(move), AI_TIME_LIMIT)
+
+    def return_to_menu(self):
+        self.cancel_ai_search()
+        self.animating = False
+        self.game_state = 'main_menu'
+
     def handle_click(self, mouse_pos):
         if self.ai_is_thinking: return
         if self.game_state == 'main_menu':
@@ -615,7 +607,7 @@ class Game:
             is_human_turn = self.game_mode == 'pvp' or (self.game_mode == 'pvai' and self.current_player == 1)
             if is_human_turn: self.handle_player_move(mouse_pos)
         elif self.game_state == 'game_over':
-            self.game_state = 'main_menu'
+            self.return_to_menu()
 
     def handle_player_move(self, mouse_pos):
         self.selected_pawn = None;
@@ -633,7 +625,7 @@ class Game:
         elif clicked_wall:
             self.execute_move(('wall', clicked_wall))
 
-    def execute_move(self, move):
+    def execute_move(self, move, search=None):
         move_type, move_data = move
         if move_type == 'pawn':
             moving_player = self.current_player
@@ -649,31 +641,24 @@ class Game:
                         SQUARE_SIZE - WALL_THICKNESS) / 2
 
             # Update the logical position immediately, but the visual one will animate
-            if moving_player == 1:
-                self.player1_pos = move_data
-            else:
-                self.player2_pos = move_data
+            self.position.make_move(moving_player == 2, to_cell(move_data))
+            self.record_move(move, search)
+            self.report_move_to_ponderer(move)
         elif move_type == 'wall':
             wall_type, pos = move_data
-            if self.is_valid_wall_placement(wall_type, pos):
-                if wall_type == 'h':
-                    self.horizontal_walls.add(pos)
-                else:
-                    self.vertical_walls.add(pos)
-                if self.path_exists(self.player1_pos, self.player1_goal_row, self.player2_pos) and self.path_exists(
-                        self.player2_pos, self.player2_goal_row, self.player1_pos):
-                    if self.current_player == 1:
-                        self.player1_walls -= 1
-                    else:
-                        self.player2_walls -= 1
+            is_p2 = self.current_player == 2
+            if (self.player2_walls if is_p2 else self.player1_walls) == 0:
+                self.error_message = "No walls left!"
+                self.error_message_end_time = pygame.time.get_ticks() + 3000
+            elif self.is_valid_wall_placement(wall_type, pos):
+                if self.position.keeps_paths(wall_index(wall_type, pos)):
+                    self.position.place_wall(is_p2, encode_move(move))
+                    self.record_move(move, search)
                     self.current_player = 3 - self.current_player
+                    self.report_move_to_ponderer(move)
                 else:
                     self.error_message = "Wall must not block all paths!";
                     self.error_message_end_time = pygame.time.get_ticks() + 3000
-                    if wall_type == 'h':
-                        self.horizontal_walls.remove(pos)
-                    else:
-                        self.vertical_walls.remove(pos)
 
     def run(self):
         running = True
@@ -706,6 +691,7 @@ class Game:
                     goal_row = self.player1_goal_row if self.animation_player == 1 else self.player2_goal_row
                     if pawn_pos[1] == goal_row:
                         self.winner, self.game_state = self.animation_player, 'game_over'
+                        if self.recording: self.records.end_game(self.winner)
                     else:
                         self.current_player = 3 - self.current_player
                 else:
@@ -713,7 +699,15 @@ class Game:
                     self.animating_pawn_pixels[0] += (dx / distance) * animation_speed
                     self.animating_pawn_pixels[1] += (dy / distance) * animation_speed
             for event in pygame.event.get():
-                if event.type == pygame.QUIT: running = False
+                if event.type == pygame.QUIT:
+                    self.cancel_ai_search()
+                    running = False
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE and self.game_state != 'main_menu':
+                    self.return_to_menu()
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_s:
+                    self.show_search_stats = not self.show_search_stats
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.last_frame_key = None  # Whatever covered the window left it to be repainted
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if not self.animating:
                         self.handle_click(pygame.mouse.get_pos())
@@ -727,7 +721,13 @@ class Game:
                 self.ai_is_thinking = True
                 self.ai_start_time = time.time()
                 ai_to_move = self.ai_player1 if self.current_player == 1 else self.ai_player2
-                ai_to_move.find_best_move(time_limit=3)
+                self.stats_ai = ai_to_move
+                if self.pondered_search is not None:
+                    thread, result = self.pondered_search
+                    self.pondered_search = None
+                else:
+                    thread, result = ai_to_move.find_best_move_async(self.position, AI_TIME_LIMIT)
+                self.ai_thread_container[self.current_player] = {'thread': thread, 'result_dict': result}
 
             if self.ai_is_thinking:
                 thread_info = self.ai_thread_container.get(self.current_player)
@@ -743,7 +743,8 @@ class Game:
                         self.board_evaluation = score
 
                     if move:
-                        self.execute_move(move)
+                        self.execute_move(move, self.ai_player1 if self.current_player == 1 else self.ai_player2)
+                        if AI_PONDER and self.game_mode == 'pvai': self.ai_player2.start_pondering(self.position)
                     else:
                         my_pos = self.player1_pos if self.current_player == 1 else self.player2_pos
                         op_pos = self.player2_pos if self.current_player == 1 else self.player1_pos
@@ -764,23 +765,11 @@ class Game:
             else:
                 self.ghost_wall = None
 
-            self.screen.fill(BROWN)
-            if self.game_state == 'main_menu':
-                self.draw_main_menu()
-            elif self.game_state == 'playing' or self.game_state == 'game_over':
-                self.draw_board()
-                self.draw_walls()
-                if self.game_state == 'playing': self.draw_valid_moves()
-                self.draw_ghost_wall()
-                self.draw_pawns()
-                self.draw_hud()
-                self.draw_error_message()
-                self.draw_evaluation_bar()
-                if self.game_state == 'game_over': self.draw_game_over_screen()
-                self.draw_evaluation_bar()
-
-            pygame.display.flip()
-            self.clock.tick(60)
+            self.draw_frame()
+            self.clock.tick(AI_THINKING_FPS if self.ai_is_thinking else FPS)
+        for ai in (self.ai_player1, self.ai_player2): ai.close()
+        if self.opening_book is not None: self.opening_book.close()
+        if self.records is not None: self.records.close()
         pygame.quit()
         sys.exit()
 
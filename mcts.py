@@ -0,0 +1,296 @@
+"""Monte Carlo Tree Search engine, an alternative to the alpha-beta AI in engine.py.
+
+MCTS has the same find_best_move / find_best_move_async contract as engine.AI, so either one can play
+either side. It uses UCT selection, playouts that mostly follow each pawn's shortest path, wall
+candidates taken from the opponent's shortest path, and keeps the subtree of the move actually played
+between turns. With workers > 1 every worker process grows its own tree and the root visit counts are
+summed (root parallelisation).
+"""
+import math
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import BOARD_SIZE, BoardState, H_WALL_BASE, PLAYER1_GOAL_ROW, PLAYER2_GOAL_ROW, UNREACHABLE, decode_move
+
+# --- Constants ---
+EXPLORATION = 1.0  # UCT exploration constant
+PLAYOUT_PLIES = 24  # Playouts that run longer are scored by the shortest-path race
+PLAYOUT_WALL_PROBABILITY = 0.15  # Chance a playout move tries a wall (when the mover has one)
+PLAYOUT_GREEDY_PROBABILITY = 0.9  # Chance a playout pawn move steps along the shortest path
+TIME_CHECK_INTERVAL = 32  # Iterations between deadline / stop checks
+SCORE_SCALE = 10  # Win rates are reported on the minimax scale the evaluation bar expects
+
+
+def path_walls(state, cell, dist):
+    """ Wall slots cutting one shortest path from cell to the goal dist measures, in slot order """
+    mask = state.shortest_path_walls(cell, dist)
+    walls = []
+    while mask:
+        low_bit = mask & -mask
+        walls.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return walls
+
+
+def blocks_a_path(state):
+    return state.dist1[state.p1] == UNREACHABLE or state.dist2[state.p2] == UNREACHABLE
+
+
+def candidate_moves(state, is_p2):
+    """ Pawn moves plus the free wall slots on the opponent's current shortest path.
+
+    Walls are not checked for leaving both players a path here; that costs a distance repair each, so
+    it is done only when a wall is actually tried.
+    """
+    if is_p2:
+        my_cell, op_cell, walls_left, op_dist = state.p2, state.p1, state.p2_walls, state.dist1
+    else:
+        my_cell, op_cell, walls_left, op_dist = state.p1, state.p2, state.p1_walls, state.dist2
+    moves = state.pawn_moves(my_cell, op_cell)
+    if walls_left:
+        for index in path_walls(state, op_cell, op_dist):
+            if state.can_place_wall(index): moves.append(H_WALL_BASE + index)
+    return moves
+
+
+class Node:
+    """One position in the tree; visits and wins are counted for the player who moved into it."""
+    __slots__ = ('move', 'parent', 'is_p2', 'key', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, move, parent, is_p2, key, untried):
+        self.move = move
+        self.parent = parent
+        self.is_p2 = is_p2
+        self.key = key
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0
+
+
+# Worker-process side of root parallelisation: one MCTS per process, kept for the pool's
+# lifetime so it can reuse its own tree on the next move too.
+_worker_mcts = None
+
+
+def _init_mcts_worker(stop_event):
+    global _worker_mcts
+    _worker_mcts = MCTS(0)
+    _worker_mcts.stop_event = stop_event
+
+
+def _search_mcts_root(position, is_p2_turn, deadline):
+    mcts = _worker_mcts
+    mcts.deadline = deadline
+    root = mcts.grow(BoardState(*position), is_p2_turn)
+    return [(child.move, child.visits, child.wins) for child in root.children], mcts.nodes
+
+
+class MCTS:
+    def __init__(self, player_number, workers=1, seed=None, exploration=EXPLORATION):
+        self.player_number = player_number
+        self.workers = workers
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.exploration = exploration
+        self.stop_event = threading.Event()
+        self.deadline = math.inf
+        self.root = None
+        self.nodes = 0
+        self.current_depth = 0
+        self.search_stats = []  # Per-depth records are an alpha-beta notion; kept empty for the HUD
+        self.ponder = None  # MCTS keeps its tree between moves instead of pondering
+        self.pool = None
+        self.worker_stop_event = None
+
+    def stop(self):
+        self.stop_event.set()
+        if self.worker_stop_event is not None: self.worker_stop_event.set()
+
+    def _clear_stop(self):
+        self.stop_event.clear()
+        if self.worker_stop_event is not None: self.worker_stop_event.clear()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def _get_pool(self):
+        if self.pool is None:
+            context = multiprocessing.get_context('spawn')
+            self.worker_stop_event = context.Event()
+            # Workers always seed from the OS so their trees differ from each other and from this one.
+            self.pool = ProcessPoolExecutor(max_workers=self.workers - 1, mp_context=context,
+                                            initializer=_init_mcts_worker, initargs=(self.worker_stop_event,))
+        return self.pool
+
+    def start_pondering(self, position):
+        pass
+
+    def stop_pondering(self):
+        pass
+
+    def _reuse_root(self, state, is_p2_turn):
+        # The previous root's grandchildren are the positions after our move and the opponent's reply.
+        if self.root is None: return None
+        for child in self.root.children:
+            for grandchild in child.children:
+                if grandchild.key == state.key and grandchild.is_p2 != is_p2_turn:
+                    grandchild.parent = None
+                    return grandchild
+        if self.root.key == state.key and self.root.is_p2 != is_p2_turn: return self.root
+        return None
+
+    def grow(self, state, is_p2_turn):
+        """ Runs MCTS iterations on state until the deadline or a stop; returns the root """
+        root = self._reuse_root(state, is_p2_turn)
+        if root is None: root = Node(None, None, not is_p2_turn, state.key, candidate_moves(state, is_p2_turn))
+        self.root = root
+        self.nodes = 0
+        while True:
+            if not self.nodes % TIME_CHECK_INTERVAL:
+                if time.time() > self.deadline or self.stop_event.is_set(): break
+                # Kept current while growing so the HUD can show how deep the tree reaches mid-search.
+                self.current_depth = self._principal_depth(root)
+            self.nodes += 1
+            self._iterate(root, state)
+        return root
+
+    @staticmethod
+    def _principal_depth(root):
+        """ Length of the line that follows the most-visited child from root """
+        depth, node = 0, root
+        while node.children:
+            node = max(node.children, key=lambda child: child.visits)
+            depth += 1
+        return depth
+
+    def _uct_child(self, node):
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        return max(node.children, key=lambda child: child.wins / child.visits +
+                   exploration * math.sqrt(log_visits / child.visits))
+
+    def _iterate(self, root, state):
+        node, made = root, []
+        while not node.untried and node.children:
+            node = self._uct_child(node)
+            made.append((node.is_p2, node.move, state.make_move(node.is_p2, node.move)))
+
+        is_p2 = not node.is_p2
+        while node.untried and not state.is_game_over():
+            move = node.untried.pop(self.rng.randrange(len(node.untried)))
+            undo = state.make_move(is_p2, move)
+            if move >= H_WALL_BASE and blocks_a_path(state):
+                state.unmake_move(is_p2, move, undo)
+                continue
+            made.append((is_p2, move, undo))
+            untried = [] if state.is_game_over() else candidate_moves(state, not is_p2)
+            child = Node(move, node, is_p2, state.key, untried)
+            node.children.append(child)
+            node = child
+            break
+
+        winner_is_p2 = self._playout(state, not node.is_p2)
+        for is_p2, move, undo in reversed(made):
+            state.unmake_move(is_p2, move, undo)
+        while node is not None:
+            node.visits += 1
+            if node.is_p2 == winner_is_p2: node.wins += 1
+            node = node.parent
+
+    def _playout(self, state, is_p2_turn):
+        """ Plays on from state with the playout policy and returns whether Player 2 won """
+        made = []
+        for _ in range(PLAYOUT_PLIES):
+            if state.is_game_over(): break
+            played = self._playout_move(state, is_p2_turn)
+            if played is None: break  # Boxed in with no wall to play: the race below decides it
+            made.append((is_p2_turn, *played))
+            is_p2_turn = not is_p2_turn
+
+        if state.p1 // BOARD_SIZE == PLAYER1_GOAL_ROW:
+            winner_is_p2 = False
+        elif state.p2 // BOARD_SIZE == PLAYER2_GOAL_ROW:
+            winner_is_p2 = True
+        else:
+            # Unfinished: call it a race, which the side to move wins on equal distances.
+            p1_path, p2_path = state.dist1[state.p1], state.dist2[state.p2]
+            winner_is_p2 = p2_path <= p1_path if is_p2_turn else p2_path < p1_path
+        for is_p2, move, undo in reversed(made):
+            state.unmake_move(is_p2, move, undo)
+        return winner_is_p2
+
+    def _playout_move(self, state, is_p2):
+        """ Picks and makes one playout move; returns (move, undo), or None if the mover has no move """
+        rng = self.rng
+        if is_p2:
+            my_cell, op_cell, walls_left, my_dist, op_dist = state.p2, state.p1, state.p2_walls, state.dist2, state.dist1
+        else:
+            my_cell, op_cell, walls_left, my_dist, op_dist = state.p1, state.p2, state.p1_walls, state.dist1, state.dist2
+        if walls_left and rng.random() < PLAYOUT_WALL_PROBABILITY:
+            index = rng.choice(path_walls(state, op_cell, op_dist))
+            if state.can_place_wall(index):
+                move = H_WALL_BASE + index
+                undo = state.make_move(is_p2, move)
+                if not blocks_a_path(state): return move, undo
+                state.unmake_move(is_p2, move, undo)
+        moves = state.pawn_moves(my_cell, op_cell)
+        if not moves: return None
+        move = min(moves, key=my_dist.__getitem__) if rng.random() < PLAYOUT_GREEDY_PROBABILITY else rng.choice(moves)
+        return move, state.make_move(is_p2, move)
+
+    def _best_move(self, position):
+        is_p2_turn = self.player_number == 2
+        state = position.copy()
+        futures = []
+        if self.workers > 1:
+            pool = self._get_pool()
+            packed = (state.p1, state.p2, state.p1_walls, state.p2_walls, state.h_walls, state.v_walls)
+            futures = [pool.submit(_search_mcts_root, packed, is_p2_turn, self.deadline)
+                       for _ in range(self.workers - 1)]
+
+        root = self.grow(state, is_p2_turn)
+        totals = {child.move: [child.visits, child.wins] for child in root.children}
+        for future in futures:
+            children, nodes = future.result()
+            self.nodes += nodes
+            for move, visits, wins in children:
+                total = totals.setdefault(move, [0, 0])
+                total[0] += visits
+                total[1] += wins
+
+        self.current_depth = self._principal_depth(root)
+
+        if not totals:
+            my_cell, op_cell = (position.p2, position.p1) if is_p2_turn else (position.p1, position.p2)
+            fallback_moves = position.pawn_moves(my_cell, op_cell)
+            return (decode_move(fallback_moves[0]) if fallback_moves else None), 0
+        best_move, (visits, wins) = max(totals.items(), key=lambda item: item[1][0])
+        win_rate = min(max(wins / visits, 0.001), 0.999)
+        p2_win_rate = win_rate if is_p2_turn else 1 - win_rate
+        return decode_move(best_move), SCORE_SCALE * math.atanh(2 * p2_win_rate - 1)
+
+    def find_best_move(self, position, time_limit):
+        """ Searches position for this AI's player and returns (move, score) in the GUI's move format """
+        self._clear_stop()
+        self.deadline = time.time() + time_limit
+        return self._best_move(position)
+
+    def find_best_move_async(self, position, time_limit):
+        """ Runs find_best_move on a background thread; returns the thread and the dict it fills in """
+        self._clear_stop()
+        self.deadline = time.time() + time_limit
+        position = position.copy()
+        result = {}
+
+        def search_thread():
+            result['move'], result['score'] = self._best_move(position)
+
+        thread = threading.Thread(target=search_thread)
+        thread.start()
+        return thread, result
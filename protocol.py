@@ -0,0 +1,413 @@
+"""Line-based engine protocol in the spirit of UCI, over stdin/stdout or a local TCP or Unix socket.
+
+The client sends one command per line; the engine answers with lines of its own:
+
+    qei                                     -> id name ..., option ..., qeiok
+    isready                                 -> readyok
+    setoption name Evaluation value walls
+    newgame                                 back to the initial position
+    position startpos [moves e2 e8 e3h ...]
+    position text <6 fields> [moves ...]    a position in engine.format_position notation
+    go [movetime <ms>] [depth <n>] [nodes <n>] [infinite]
+                                            -> info lines, one per completed depth, then bestmove <move>
+                                            (after an infinite search only once stop arrives)
+    stop                                    ends the search early; its bestmove still follows
+    show                                    -> position text <the current position>
+    quit
+
+Moves and positions use the notation in engine.py ("e2", "e3h", "e1 e9 10 10 - 1"). Info lines read
+"info depth 4 score 2 nodes 5123 time 48 pv e2 e8 e3h": the score is in path steps from the side to
+move's view ("win" / "loss" once a pawn reaches its goal inside the search), nodes and time in
+milliseconds count from the start of the search. A malformed command is answered with
+"info string error: ..." and otherwise ignored.
+
+Searches run in a pool of worker processes shared by every connection, so one server holds many games
+at once. A go's movetime counts from when the command arrived, so a search that waited for a free
+worker only gets what is left, and a busy server still answers within the time it was given.
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import AI, BoardState, OpeningBook, EVALUATION_WALL_WEIGHTS, MAX_SEARCH_DEPTH, MAX_PLY, encode_move, \
+    format_move, format_position, parse_move, parse_position
+
+# --- Constants ---
+ENGINE_NAME = 'Quoridor AI'
+ENGINE_AUTHOR = 'Rashid Al-Qobbaj'
+TT_SIZE_MB = 64  # Per worker process
+SLOTS_PER_WORKER = 4  # Searches queued or running per worker before another go waits for one to end
+DEFAULT_HOST = '127.0.0.1'
+
+
+# --- Worker Processes ---
+_worker_flags = None  # One stop flag per search slot, shared with the server process
+_worker_messages = None  # (slot, search id, line) back to the server, in the order the client must see them
+_worker_tt_size_mb = TT_SIZE_MB
+_worker_book_path = None
+_worker_ais = {}
+
+
+class _SlotStop:
+    """ Stands in for AI.stop_event: one search slot's flag in memory shared with the server """
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def is_set(self):
+        return _worker_flags[self.slot] != 0
+
+    def set(self):
+        _worker_flags[self.slot] = 1
+
+    def clear(self):
+        # The server clears a slot's flag when it hands the slot out; clearing it again here would
+        # lose a stop sent before this worker picked the search up.
+        pass
+
+
+def _init_worker(flags, messages, tt_size_mb, book_path):
+    global _worker_flags, _worker_messages, _worker_tt_size_mb, _worker_book_path
+    _worker_flags, _worker_messages = flags, messages
+    _worker_tt_size_mb, _worker_book_path = tt_size_mb, book_path
+
+
+def _worker_ai(evaluation):
+    # The table is keyed by the side to move, so one AI serves both players of every game; each
+    # evaluation keeps its own, since their scores can't share a table.
+    ai = _worker_ais.get(evaluation)
+    if ai is None:
+        book = OpeningBook(_worker_book_path) if _worker_book_path is not None else None
+        ai = _worker_ais[evaluation] = AI(1, _worker_tt_size_mb, evaluation=evaluation, book=book)
+    return ai
+
+
+def side_score(score, is_p2_turn):
+    """ A search score (Player 2's view) from the side to move's view: whole path steps, or 'win' / 'loss' """
+    score = score if is_p2_turn else -score
+    return ('win' if score > 0 else 'loss') if math.isinf(score) else round(score)
+
+
+def info_line(record, is_p2_turn, nodes, seconds):
+    """ The info line for one completed search_stats record """
+    line = (f"info depth {record['depth']} score {side_score(record['score'], is_p2_turn)} nodes {nodes} "
+            f"time {round(seconds * 1000)}")
+    if record['pv']: line += ' pv ' + ' '.join(format_move(move) for move in record['pv'])
+    return line
+
+
+def _run_search(slot, search_id, position, evaluation, max_depth, node_limit, deadline):
+    """ Searches one position in a worker, sending its info lines and then its bestmove line for slot """
+    state, is_p2_turn = parse_position(position)
+    ai = _worker_ai(evaluation)
+    ai.player_number, ai.max_depth, ai.node_limit = (2 if is_p2_turn else 1), max_depth, node_limit
+    ai.stop_event = _SlotStop(slot)
+    start_time, nodes = time.time(), 0
+
+    def on_depth(record):
+        nonlocal nodes
+        nodes += record['nodes']
+        if record['completed']:
+            _worker_messages.put((slot, search_id, info_line(record, is_p2_turn, nodes, time.time() - start_time)))
+
+    ai.on_depth = on_depth
+    try:
+        move, _ = ai.find_best_move(state, deadline - start_time)
+    finally:
+        ai.on_depth = None
+    bestmove = format_move(encode_move(move)) if move is not None else 'none'
+    _worker_messages.put((slot, search_id, 'bestmove ' + bestmove))
+
+
+# --- Protocol ---
+def parse_go(args):
+    """ Returns (time limit in seconds, max depth, node limit, infinite) for the words after go """
+    time_limit, max_depth, node_limit, infinite = math.inf, MAX_SEARCH_DEPTH, math.inf, False
+    words = iter(args)
+    for word in words:
+        if word == 'infinite':
+            infinite = True
+            continue
+        value = next(words, None)
+        if word not in ('movetime', 'depth', 'nodes') or value is None or not value.isdigit():
+            raise ValueError(f"bad go option '{word}'")
+        if word == 'movetime':
+            time_limit = int(value) / 1000
+        elif word == 'nodes':
+            node_limit = int(value)
+        elif not 1 <= int(value) <= MAX_PLY:
+            raise ValueError(f"depth must be 1-{MAX_PLY}")
+        else:
+            max_depth = int(value)
+    return time_limit, max_depth, node_limit, infinite
+
+
+def parse_position_command(args):
+    """ Returns (BoardState, is_p2_turn) for the words after position, with any moves played """
+    if args[:1] == ['startpos']:
+        state, is_p2_turn, rest = BoardState.initial(), False, args[1:]
+    elif args[:1] == ['text']:
+        state, is_p2_turn = parse_position(' '.join(args[1:7]))
+        rest = args[7:]
+    else:
+        raise ValueError("position needs startpos or text")
+    if rest and rest[0] != 'moves':
+        raise ValueError(f"unexpected '{rest[0]}' after the position")
+    for word in rest[1:]:
+        move = parse_move(word)
+        if state.is_game_over() or not state.is_legal_move(is_p2_turn, move):
+            raise ValueError(f"illegal move '{word}'")
+        state.make_move(is_p2_turn, move)
+        is_p2_turn = not is_p2_turn
+    return state, is_p2_turn
+
+
+class Session:
+    """ One client's game: its position and options, and the search it has running, if any """
+
+    def __init__(self, server, send):
+        self.server = server
+        self.send = send
+        self.state, self.is_p2_turn = BoardState.initial(), False
+        self.evaluation = 'path'
+        self.slot = None
+        self.stop_requested = False
+        self.infinite = False
+        self.held_bestmove = None  # An infinite search's bestmove, sent once the client stops it
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def handle(self, line):
+        """ Runs one command line; returns False once the client has quit """
+        words = line.split()
+        if not words: return True
+        command, args = words[0], words[1:]
+        try:
+            if command == 'quit':
+                self.stop()
+                return False
+            if command == 'qei':
+                self.send(f"id name {ENGINE_NAME}")
+                self.send(f"id author {ENGINE_AUTHOR}")
+                self.send(f"option name Evaluation type combo default path "
+                          f"{' '.join('var ' + name for name in EVALUATION_WALL_WEIGHTS)}")
+                self.send('qeiok')
+            elif command == 'isready':
+                self.send('readyok')
+            elif command == 'setoption':
+                self.set_option(args)
+            elif command == 'newgame':
+                self.state, self.is_p2_turn = BoardState.initial(), False
+            elif command == 'position':
+                self.state, self.is_p2_turn = parse_position_command(args)
+            elif command == 'go':
+                self.go(*parse_go(args))
+            elif command == 'stop':
+                self.stop()
+            elif command == 'show':
+                self.send('position text ' + format_position(self.state, self.is_p2_turn))
+            else:
+                raise ValueError(f"unknown command '{command}'")
+        except ValueError as error:
+            self.send(f"info string error: {error}")
+        return True
+
+    def set_option(self, args):
+        if 'value' not in args or args[:1] != ['name']:
+            raise ValueError("expected setoption name <name> value <value>")
+        split = args.index('value')
+        name, value = ' '.join(args[1:split]), ' '.join(args[split + 1:])
+        if name.lower() != 'evaluation':
+            raise ValueError(f"unknown option '{name}'")
+        if value not in EVALUATION_WALL_WEIGHTS:
+            raise ValueError(f"unknown evaluation '{value}', expected one of {', '.join(EVALUATION_WALL_WEIGHTS)}")
+        self.evaluation = value
+
+    def go(self, time_limit, max_depth, node_limit, infinite):
+        if not self.idle.is_set():
+            raise ValueError("already searching")
+        if self.state.is_game_over():
+            self.send('bestmove none')
+            return
+        self.idle.clear()
+        self.stop_requested, self.infinite = False, infinite
+        asyncio.get_running_loop().create_task(
+            self.search(format_position(self.state, self.is_p2_turn), time.time() + time_limit, max_depth, node_limit))
+
+    async def search(self, position, deadline, max_depth, node_limit):
+        self.slot, search_id = await self.server.acquire_slot(self)
+        self.server.flags[self.slot] = self.stop_requested
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self.server.pool, _run_search, self.slot, search_id, position, self.evaluation, max_depth, node_limit,
+                deadline)
+        except Exception as error:
+            # A worker that died sends no bestmove of its own. Lines it sent before may still be queued, but
+            # they carry this search's id, so once the slot is handed on they are dropped rather than delivered.
+            self.send(f"info string error: search failed: {error!r}")
+            self.search_line('bestmove none')
+
+    def search_line(self, line):
+        """ A line from this session's search; the bestmove line ends the search, though an infinite
+        search that runs out of depth holds it back until stop, as the client expects.
+        """
+        if not line.startswith('bestmove'):
+            self.send(line)
+            return
+        if self.slot is not None:
+            self.server.release_slot(self.slot)
+            self.slot = None
+        if self.infinite and not self.stop_requested:
+            self.held_bestmove = line
+            return
+        self.send(line)
+        self.idle.set()
+
+    def stop(self):
+        self.stop_requested = True
+        if self.slot is not None: self.server.flags[self.slot] = 1
+        if self.held_bestmove is not None:
+            line, self.held_bestmove = self.held_bestmove, None
+            self.send(line)
+            self.idle.set()
+
+
+class EngineServer:
+    """ The worker pool and search slots shared by every session """
+
+    def __init__(self, workers, tt_size_mb=TT_SIZE_MB, book_path=None):
+        context = multiprocessing.get_context('spawn')
+        slots = workers * SLOTS_PER_WORKER
+        self.flags = context.RawArray('B', slots)
+        self.messages = context.Queue()
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                        initargs=(self.flags, self.messages, tt_size_mb, book_path))
+        self.free_slots = asyncio.Queue()
+        for slot in range(slots): self.free_slots.put_nowait(slot)
+        self.owners = {}  # slot -> (search id, session) for each slot handed out
+        self.search_count = 0
+        self.loop = asyncio.get_running_loop()
+        # Worker messages arrive on a blocking queue, so a thread hands them to the event loop.
+        self.pump = threading.Thread(target=self._pump_messages, daemon=True)
+        self.pump.start()
+
+    def _pump_messages(self):
+        while True:
+            message = self.messages.get()
+            if message is None: return
+            self.loop.call_soon_threadsafe(self._deliver, *message)
+
+    def _deliver(self, slot, search_id, line):
+        # A line from an earlier search in this slot is stale: that search has already ended.
+        search_id_now, owner = self.owners.get(slot, (None, None))
+        if search_id_now == search_id: owner.search_line(line)
+
+    async def acquire_slot(self, session):
+        """ Hands session a free slot, with an id that tells its search's lines from any earlier search's """
+        slot = await self.free_slots.get()
+        self.search_count += 1
+        self.owners[slot] = (self.search_count, session)
+        return slot, self.search_count
+
+    def release_slot(self, slot):
+        del self.owners[slot]
+        self.free_slots.put_nowait(slot)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        self.messages.put(None)
+        self.pump.join()
+
+    async def serve_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername') or 'unix socket'
+        print(f"connected: {peer}", file=sys.stderr)
+
+        def send(line):
+            if not writer.is_closing(): writer.write(line.encode() + b'\n')
+
+        session = Session(self, send)
+        try:
+            async for raw in reader:
+                if not session.handle(raw.decode(errors='replace')): break
+                await writer.drain()
+            session.stop()
+            await session.idle.wait()
+        except ConnectionError:
+            session.stop()
+        finally:
+            writer.close()
+            print(f"disconnected: {peer}", file=sys.stderr)
+
+    async def serve_stdio(self):
+        lines = asyncio.Queue()
+
+        def read_stdin():
+            # A daemon thread, so a blocked read never holds up exit after quit.
+            for line in sys.stdin:
+                self.loop.call_soon_threadsafe(lines.put_nowait, line)
+            self.loop.call_soon_threadsafe(lines.put_nowait, None)
+
+        threading.Thread(target=read_stdin, daemon=True).start()
+        session = Session(self, lambda line: print(line, flush=True))
+        while True:
+            line = await lines.get()
+            # At the end of input a running search is left to finish, so piped commands get their answer;
+            # only an infinite one is stopped, since no stop can follow any more.
+            if line is None:
+                if session.infinite: session.stop()
+                break
+            if not session.handle(line): break
+        await session.idle.wait()
+
+
+async def serve(args):
+    server = EngineServer(args.workers, args.hash, args.book)
+    try:
+        if args.tcp is None and args.unix is None:
+            await server.serve_stdio()
+            return
+        if args.unix is not None:
+            listener = await asyncio.start_unix_server(server.serve_connection, args.unix)
+        else:
+            host, _, port = args.tcp.rpartition(':')
+            listener = await asyncio.start_server(server.serve_connection, host or DEFAULT_HOST, int(port))
+        print(f"listening on {args.unix or args.tcp} with {args.workers} workers", file=sys.stderr)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+        if args.unix is not None and os.path.exists(args.unix): os.unlink(args.unix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the AI over a line-based engine protocol on stdin/stdout "
+                                                 "or a local socket.")
+    listen = parser.add_mutually_exclusive_group()
+    listen.add_argument('--tcp', metavar='[HOST:]PORT', help=f"Listen on a TCP port (host defaults to {DEFAULT_HOST})")
+    listen.add_argument('--unix', metavar='PATH', help="Listen on a Unix socket")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Search processes (default: 1 on stdin/stdout, one per core on a socket)")
+    parser.add_argument('--hash', type=int, default=TT_SIZE_MB, help="Transposition table MB per worker")
+    parser.add_argument('--book', default=None, help="Opening book file consulted before searching")
+    args = parser.parse_args()
+    if args.book is not None:
+        try:
+            OpeningBook(args.book).close()
+        except (OSError, ValueError) as error:
+            parser.error(f"--book: {error}")
+    if args.workers is None:
+        args.workers = 1 if args.tcp is None and args.unix is None else os.cpu_count() or 1
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Compact binary game records: written one move at a time, replayed in bulk without pygame.
+
+A record file holds any number of games back to back as a stream of 8-byte entries (RECORD_ENTRY):
+
+    game start  code GAME_START; the length of the metadata that follows, ASCII JSON padded with
+                spaces to a whole number of entries (engine settings, players, start position, ...)
+    move        the engine move code (0-208), the deepest completed search depth (0 for a human,
+                book or Monte Carlo move), the score from Player 2's view (clamped to int16, the limit
+                meaning a won line) and the time taken in milliseconds
+    game end    code GAME_END, with the winner (0 for none) in the depth byte
+
+Every entry is flushed as soon as it is written, so a crash loses at most the entry being written: the
+reader returns a game cut off that way with finished False, and a later writer trims a torn final entry,
+or a game start whose metadata was cut short, before appending. Metadata bytes are all ASCII, so no entry
+inside it starts with GAME_START; that lets the reader tell a torn game start from its metadata even in a
+file appended to without the trim. Move notation for display is engine.format_move.
+"""
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+
+from engine import BoardState, BOOK_SCORE_LIMIT, H_WALL_BASE, WALL_SLOTS, ZOBRIST_P1, ZOBRIST_P2, ZOBRIST_P1_WALLS, \
+    ZOBRIST_P2_WALLS, ZOBRIST_WALL, format_move, format_position, parse_position
+
+# --- Constants ---
+RECORD_ENTRY = struct.Struct('<BBhI')  # code, depth, score, milliseconds (metadata length for GAME_START)
+GAME_START = 0xFE
+GAME_END = 0xFF
+RECORD_SCORE_LIMIT = BOOK_SCORE_LIMIT
+MAX_MILLISECONDS = 0xFFFFFFFF
+
+
+class GameWriter:
+    """Appends games to a record file. Call start_game, then write_move for every move as it is played
+    and end_game once it is decided; a game that is never ended reads back as unfinished.
+    """
+
+    def __init__(self, path, durable=True):
+        self.durable = durable  # fsync every entry, not just flush it, so it survives the machine crashing
+        self.file = open(path, 'a+b')
+        self._trim_torn_tail()
+
+    def _trim_torn_tail(self):
+        # Cuts a torn final entry, then the last game start too if its metadata runs past the end.
+        size = self.file.seek(0, os.SEEK_END)
+        size -= size % RECORD_ENTRY.size
+        offset = size - RECORD_ENTRY.size
+        while offset >= 0:
+            self.file.seek(offset)
+            code, _, _, length = RECORD_ENTRY.unpack(self.file.read(RECORD_ENTRY.size))
+            if code == GAME_START:
+                if offset + RECORD_ENTRY.size + length > size: size = offset
+                break
+            offset -= RECORD_ENTRY.size
+        self.file.truncate(size)
+
+    def _write(self, data):
+        self.file.write(data)
+        self.file.flush()
+        if self.durable: os.fsync(self.file.fileno())
+
+    def start_game(self, metadata):
+        text = json.dumps(metadata).encode()
+        text += b' ' * (-len(text) % RECORD_ENTRY.size)
+        self._write(RECORD_ENTRY.pack(GAME_START, 0, 0, len(text)) + text)
+
+    def write_move(self, code, depth=0, score=None, seconds=0.0):
+        score = 0 if score is None else int(max(-RECORD_SCORE_LIMIT, min(RECORD_SCORE_LIMIT, score)))
+        self._write(RECORD_ENTRY.pack(code, depth, score, min(round(seconds * 1000), MAX_MILLISECONDS)))
+
+    def end_game(self, winner):
+        self._write(RECORD_ENTRY.pack(GAME_END, winner or 0, 0, 0))
+
+    def close(self):
+        self.file.close()
+
+
+def read_games(path):
+    """ Yields each game in a record file as {'metadata', 'moves', 'winner', 'finished'}, where moves
+    is a list of (code, depth, score, seconds) and winner is None for a game without one.
+    """
+    with open(path, 'rb') as record_file:
+        if os.fstat(record_file.fileno()).st_size < RECORD_ENTRY.size: return
+        data = mmap.mmap(record_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        end = len(data) - len(data) % RECORD_ENTRY.size
+        unpack_from, entry_size = RECORD_ENTRY.unpack_from, RECORD_ENTRY.size
+        game = None
+        offset = 0
+        while offset < end:
+            code, depth, score, value = unpack_from(data, offset)
+            offset += entry_size
+            if code == GAME_START:
+                if game is not None: yield game
+                game = {'metadata': {}, 'moves': [], 'winner': None, 'finished': False}
+                # A game start torn while its metadata was written runs past the end of the file, or into
+                # the next game's start when a writer carried on without trimming it.
+                next_start = next((position for position in range(offset, min(offset + value, end), entry_size)
+                                   if data[position] == GAME_START), None)
+                if next_start is None and offset + value <= end:
+                    game['metadata'] = json.loads(data[offset:offset + value])
+                    offset += value
+                else:
+                    offset = end if next_start is None else next_start
+            elif game is None:
+                raise ValueError(f"{path} is not a game record file")
+            elif code == GAME_END:
+                game['winner'], game['finished'] = depth or None, True
+            else:
+                if abs(score) == RECORD_SCORE_LIMIT: score = math.copysign(math.inf, score)
+                game['moves'].append((code, depth, score, value / 1000))
+        if game is not None: yield game
+    finally:
+        data.close()
+
+
+def start_position(game):
+    """ (BoardState, is_p2_turn) the game started from: metadata['start'] in position notation, if given """
+    start = game['metadata'].get('start')
+    return parse_position(start) if start else (BoardState.initial(), False)
+
+
+def replay(game):
+    """ Yields (position, key, is_p2_turn, move) before each move of a game.
+
+    position is the (p1, p2, p1_walls, p2_walls, h_walls, v_walls) tuple BoardState(*position) rebuilds
+    and key that BoardState's Zobrist key. Replay only tracks pawns, walls and the key, not the path
+    distances a BoardState keeps up to date, which is most of the cost of playing a wall.
+    """
+    state, is_p2_turn = start_position(game)
+    p1, p2, p1_walls, p2_walls, h_walls, v_walls = (state.p1, state.p2, state.p1_walls, state.p2_walls,
+                                                    state.h_walls, state.v_walls)
+    key = state.key
+    for move in game['moves']:
+        yield (p1, p2, p1_walls, p2_walls, h_walls, v_walls), key, is_p2_turn, move
+        code = move[0]
+        if code < H_WALL_BASE and is_p2_turn:
+            key ^= ZOBRIST_P2[p2] ^ ZOBRIST_P2[code]
+            p2 = code
+        elif code < H_WALL_BASE:
+            key ^= ZOBRIST_P1[p1] ^ ZOBRIST_P1[code]
+            p1 = code
+        else:
+            index = code - H_WALL_BASE
+            key ^= ZOBRIST_WALL[index]
+            if index < WALL_SLOTS * WALL_SLOTS: h_walls |= 1 << index
+            else: v_walls |= 1 << (index - WALL_SLOTS * WALL_SLOTS)
+            if is_p2_turn:
+                key ^= ZOBRIST_P2_WALLS[p2_walls] ^ ZOBRIST_P2_WALLS[p2_walls - 1]
+                p2_walls -= 1
+            else:
+                key ^= ZOBRIST_P1_WALLS[p1_walls] ^ ZOBRIST_P1_WALLS[p1_walls - 1]
+                p1_walls -= 1
+        is_p2_turn = not is_p2_turn
+
+
+def summarize(path):
+    games = finished = moves = 0
+    wins = {None: 0, 1: 0, 2: 0}
+    searched = depth_total = 0
+    seconds_total = 0.0
+    start_time = time.time()
+    for game in read_games(path):
+        games += 1
+        finished += game['finished']
+        wins[game['winner']] += 1
+        for _, _, _, move in replay(game):
+            moves += 1
+            seconds_total += move[3]
+            if move[1]:
+                searched += 1
+                depth_total += move[1]
+    elapsed = time.time() - start_time
+    print(f"{path}: {games} games ({games - finished} unfinished), {moves} moves")
+    print(f"Player 1 won {wins[1]}, Player 2 won {wins[2]}, no winner {wins[None]}")
+    if moves: print(f"Average think time {seconds_total / moves:.2f}s per move")
+    if searched: print(f"Average search depth {depth_total / searched:.1f} over {searched} searched moves")
+    print(f"Replayed in {elapsed:.2f}s ({moves / elapsed if elapsed else 0:.0f} moves/s)", file=sys.stderr)
+
+
+def show(path, index):
+    for number, game in enumerate(read_games(path)):
+        if number != index: continue
+        print(json.dumps(game['metadata'], indent=2))
+        state, is_p2_turn = start_position(game)
+        print(f"start: {format_position(state, is_p2_turn)}")
+        for ply, (_, _, is_p2_turn, (code, depth, score, seconds)) in enumerate(replay(game)):
+            searched = f"  depth {depth}, score {score:g}" if depth else ""
+            print(f"{ply + 1:>4}. Player {2 if is_p2_turn else 1}: {format_move(code):<4} {seconds:7.2f}s{searched}")
+        print(f"winner: {game['winner']}" if game['finished'] else "unfinished")
+        return
+    sys.exit(f"{path} has no game {index}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize or print the games in a game record file.")
+    parser.add_argument('path')
+    parser.add_argument('--show', type=int, metavar='INDEX', help="Print one game (counting from 0) move by move")
+    args = parser.parse_args()
+    if args.show is not None:
+        show(args.path, args.show)
+    else:
+        summarize(args.path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+from engine import AI, BoardState, OpeningBook, EVALUATION_WALL_WEIGHTS, MAX_SEARCH_DEPTH, PLAYER1_GOAL_ROW, \
+    PLAYER2_GOAL_ROW, BOARD_SIZE, encode_move, to_pos
+from mcts import MCTS
+from records import GameWriter
+
+# --- Constants ---
+DEFAULT_TIME_LIMIT = 1.0
+DEFAULT_MAX_PLIES = 200
+DEFAULT_OPENING_PLIES = 2
+TT_SIZE_MB = 16  # Per engine; many games run side by side, so keep each table small
+ENGINES = ('minimax', 'mcts')
+
+
+def parse_engine(spec):
+    """ Parses 'name=fast,time=0.5,depth=4,eval=walls,book=opening_book.bin' into an engine configuration;
+    engine=mcts selects the Monte Carlo engine, which ignores depth, eval and book.
+    """
+    config = {'name': None, 'engine': 'minimax', 'time': DEFAULT_TIME_LIMIT, 'depth': MAX_SEARCH_DEPTH, 'eval': 'path',
+              'book': None}
+    for part in spec.split(','):
+        key, _, value = part.partition('=')
+        if key not in config:
+            raise argparse.ArgumentTypeError(f"Unknown engine option '{key}' in '{spec}'")
+        config[key] = value
+    config['time'] = float(config['time'])
+    config['depth'] = int(config['depth'])
+    if config['eval'] not in EVALUATION_WALL_WEIGHTS:
+        raise argparse.ArgumentTypeError(f"Unknown evaluation '{config['eval']}', expected one of "
+                                         f"{', '.join(EVALUATION_WALL_WEIGHTS)}")
+    if config['engine'] not in ENGINES:
+        raise argparse.ArgumentTypeError(f"Unknown engine '{config['engine']}', expected one of {', '.join(ENGINES)}")
+    if config['book'] is not None:
+        try:
+            OpeningBook(config['book']).close()
+        except (OSError, ValueError) as error:
+            raise argparse.ArgumentTypeError(f"Bad book in '{spec}': {error}")
+    if config['name'] is None and config['engine'] == 'mcts':
+        config['name'] = f"mcts-t{config['time']:g}"
+    elif config['name'] is None:
+        config['name'] = f"t{config['time']:g}-d{config['depth']}-{config['eval']}"
+    return config
+
+
+def create_engine(player_number, config, seed):
+    if config['engine'] == 'mcts':
+        return MCTS(player_number, seed=seed)
+    return AI(player_number, TT_SIZE_MB, max_depth=config['depth'], evaluation=config['eval'],
+              book=OpeningBook(config['book']) if config['book'] is not None else None)
+
+
+def play_game(task):
+    """ Plays one headless game and returns its result record """
+    game_id, p1_config, p2_config, seed, max_plies, opening_plies = task
+    rng = random.Random(seed)
+    position = BoardState.initial()
+    engines = {1: create_engine(1, p1_config, seed), 2: create_engine(2, p2_config, seed)}
+    configs = {1: p1_config, 2: p2_config}
+    nodes = {1: 0, 2: 0}
+    think_time = {1: 0.0, 2: 0.0}
+    moves = []
+    record = []  # (move code, depth, score, seconds) per ply, for the game record file
+    winner = None
+    player = 1
+
+    for ply in range(max_plies):
+        is_p2 = player == 2
+        if ply < opening_plies:
+            # A few random pawn moves so repeated pairings don't replay the same game.
+            my_cell, op_cell = (position.p2, position.p1) if is_p2 else (position.p1, position.p2)
+            move = ('pawn', to_pos(rng.choice(position.pawn_moves(my_cell, op_cell))))
+            record.append((encode_move(move), 0, None, 0.0))
+        else:
+            start_time = time.time()
+            move, score = engines[player].find_best_move(position, configs[player]['time'])
+            seconds = time.time() - start_time
+            think_time[player] += seconds
+            nodes[player] += engines[player].nodes
+            depths = [entry['depth'] for entry in engines[player].search_stats if entry['completed']]
+            record.append((encode_move(move), depths[-1] if depths else 0, score, seconds))
+        position.make_move(is_p2, encode_move(move))
+        moves.append(move)
+        if position.p1 // BOARD_SIZE == PLAYER1_GOAL_ROW:
+            winner = 1
+            break
+        if position.p2 // BOARD_SIZE == PLAYER2_GOAL_ROW:
+            winner = 2
+            break
+        player = 3 - player
+    for engine in engines.values():
+        if getattr(engine, 'book', None) is not None: engine.book.close()
+
+    return {
+        'game': game_id,
+        'player1': p1_config['name'],
+        'player2': p2_config['name'],
+        'winner': winner,
+        'plies': len(moves),
+        'nodes': [nodes[1], nodes[2]],
+        'think_time': [round(think_time[1], 3), round(think_time[2], 3)],
+        'moves': moves,
+        'record': record,
+    }
+
+
+def elo_estimate(score, games):
+    """ Returns (elo, low, high) for a score fraction, with a 95% normal-approximation interval """
+    def to_elo(p):
+        p = min(max(p, 1e-6), 1 - 1e-6)
+        return 400 * math.log10(p / (1 - p))
+
+    p = score / games
+    margin = 1.96 * math.sqrt(p * (1 - p) / games)
+    return to_elo(p), to_elo(p - margin), to_elo(p + margin)
+
+
+def make_tasks(engines, games, max_plies, opening_plies, seed):
+    """ Round robin; each pairing alternates colors so neither engine always moves first """
+    tasks = []
+    for i, first in enumerate(engines):
+        for second in engines[i + 1:]:
+            for n in range(games):
+                p1, p2 = (first, second) if n % 2 == 0 else (second, first)
+                tasks.append((len(tasks), p1, p2, seed + len(tasks), max_plies, opening_plies))
+    return tasks
+
+
+def summarize(results, engines):
+    names = [engine['name'] for engine in engines]
+    stats = {name: {'games': 0, 'wins': 0, 'draws': 0, 'nodes': 0, 'time': 0.0} for name in names}
+    pair_scores = {}
+    for result in results:
+        players = (result['player1'], result['player2'])
+        for side, name in enumerate(players):
+            entry = stats[name]
+            entry['games'] += 1
+            entry['nodes'] += result['nodes'][side]
+            entry['time'] += result['think_time'][side]
+            if result['winner'] is None:
+                entry['draws'] += 1
+            elif result['winner'] == side + 1:
+                entry['wins'] += 1
+        for side, name in enumerate(players):
+            opponent = players[1 - side]
+            score = 0.5 if result['winner'] is None else float(result['winner'] == side + 1)
+            total = pair_scores.setdefault((name, opponent), [0.0, 0])
+            total[0] += score
+            total[1] += 1
+
+    print()
+    print(f"{'Engine':<24}{'Games':>7}{'Wins':>7}{'Draws':>7}{'Win %':>8}{'Nodes/s':>10}")
+    for name in names:
+        entry = stats[name]
+        win_rate = 100 * (entry['wins'] + 0.5 * entry['draws']) / entry['games'] if entry['games'] else 0
+        nps = entry['nodes'] / entry['time'] if entry['time'] else 0
+        print(f"{name:<24}{entry['games']:>7}{entry['wins']:>7}{entry['draws']:>7}{win_rate:>7.1f}%{nps:>10.0f}")
+
+    print()
+    print(f"{'Pairing':<50}{'Score':>10}{'Elo':>8}{'95% CI':>18}")
+    for i, name in enumerate(names):
+        for opponent in names[i + 1:]:
+            if (name, opponent) not in pair_scores: continue
+            score, games = pair_scores[(name, opponent)]
+            elo, low, high = elo_estimate(score, games)
+            print(f"{name + ' vs ' + opponent:<50}{score:>6g}/{games:<3}{elo:>8.0f}{f'[{low:.0f}, {high:.0f}]':>18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play headless AI-vs-AI games between engine configurations.")
+    parser.add_argument('--engine', action='append', type=parse_engine, required=True,
+                        help="Engine configuration, e.g. name=fast,time=0.5,depth=4,eval=walls,book=opening_book.bin "
+                             "or engine=mcts,time=0.5 (give at least two)")
+    parser.add_argument('--games', type=int, default=10, help="Games per pairing (colors alternate)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument('--output', default='tournament.jsonl', help="JSONL file that receives one line per game")
+    parser.add_argument('--records', default=None,
+                        help="Game record file (see records.py) that every game is also appended to")
+    parser.add_argument('--max-plies', type=int, default=DEFAULT_MAX_PLIES, help="Plies before a game is a draw")
+    parser.add_argument('--opening-plies', type=int, default=DEFAULT_OPENING_PLIES,
+                        help="Random pawn moves played before the engines take over")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if len(args.engine) < 2:
+        parser.error("give at least two --engine configurations")
+    if len({engine['name'] for engine in args.engine}) != len(args.engine):
+        parser.error("engine names must be unique")
+
+    tasks = make_tasks(args.engine, args.games, args.max_plies, args.opening_plies, args.seed)
+    results = []
+    # Finished games arrive whole, so the record file is flushed per entry but not synced to disk.
+    records = GameWriter(args.records, durable=False) if args.records is not None else None
+    with Pool(args.workers) as pool, open(args.output, 'w') as output:
+        for result in pool.imap_unordered(play_game, tasks):
+            record = result.pop('record')
+            if records is not None:
+                _, p1_config, p2_config, seed, _, opening_plies = tasks[result['game']]
+                records.start_game({'source': 'tournament', 'game': result['game'], 'seed': seed,
+                                    'opening_plies': opening_plies, 'players': [p1_config, p2_config]})
+                for entry in record: records.write_move(*entry)
+                records.end_game(result['winner'])
+            results.append(result)
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+            winner = result['player%d' % result['winner']] if result['winner'] else 'draw'
+            print(f"[{len(results)}/{len(tasks)}] game {result['game']}: {result['player1']} vs "
+                  f"{result['player2']} -> {winner} in {result['plies']} plies", file=sys.stderr)
+    if records is not None: records.close()
+    summarize(results, args.engine)
+
+
+if __name__ == '__main__':
+    main()